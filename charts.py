@@ -0,0 +1,95 @@
+# charts.py
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# /history에서 선택 가능한 시리즈: 이름 -> (차트 제목, [(포인트 키, 범례)])
+SERIES_CONFIG = {
+    "rate": ("Points per Hour", [("generalPointPerHour", "General"), ("fgpPointPerHour", "FGP")]),
+    "total": ("Total Points", [("generalPoint", "General"), ("fgpPoint", "FGP"), ("totalPoint", "Total")]),
+    "tvl": ("DeFi TVL ($)", [("defiTvl", "TVL")]),
+}
+
+# /history에서 선택 가능한 기간: 이름 -> 초 (None이면 전체)
+RANGE_CONFIG = {
+    "24h": 24 * 3600,
+    "7d": 7 * 86400,
+    "30d": 30 * 86400,
+    "all": None,
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# (기간, 시리즈, 데이터 버전) -> 텔레그램 file_id
+_file_id_cache: Dict[Tuple[str, str, int], str] = {}
+
+
+def get_chart_executor() -> ProcessPoolExecutor:
+    """차트 렌더링용 프로세스 풀 (처음 사용할 때 생성)"""
+    global _executor
+    if _executor is None:
+        # 스레드(저장 워커, to_thread 등)가 도는 프로세스에서 fork하면 자식이 멈출 수 있으므로 spawn 사용
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def shutdown_chart_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def get_cached_file_id(key: Tuple[str, str, int]) -> Optional[str]:
+    return _file_id_cache.get(key)
+
+
+def cache_file_id(key: Tuple[str, str, int], file_id: str) -> None:
+    """file_id 저장 - 데이터 버전이 바뀐 이전 항목은 더 이상 쓰이지 않으므로 제거"""
+    for old_key in [k for k in _file_id_cache if k[2] != key[2]]:
+        del _file_id_cache[old_key]
+    _file_id_cache[key] = file_id
+
+
+def extract_series(points: List[Dict], series: str) -> Tuple[List[float], Dict[str, List[Optional[float]]]]:
+    """포인트 목록에서 차트에 필요한 열만 추출 (프로세스 간 전달량을 줄이기 위함)"""
+    _, lines = SERIES_CONFIG[series]
+    timestamps = [p['updatedAt'] for p in points]
+    values = {label: [p.get(key) for p in points] for key, label in lines}
+    return timestamps, values
+
+
+def render_history_chart(title: str, timestamps: List[float],
+                         values: Dict[str, List[Optional[float]]]) -> bytes:
+    """
+    PNG 차트 렌더링 - 프로세스 풀에서 실행되므로 모듈 최상위 함수로 유지
+
+    Raises:
+        ImportError: matplotlib이 설치되어 있지 않은 경우
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    dates = [datetime.fromtimestamp(ts) for ts in timestamps]
+    fig, ax = plt.subplots(figsize=(10, 5), dpi=100)
+    try:
+        for label, series_values in values.items():
+            xs = [d for d, v in zip(dates, series_values) if v is not None]
+            ys = [v for v in series_values if v is not None]
+            ax.plot(xs, ys, label=label, linewidth=1.5)
+
+        ax.set_title(title)
+        ax.grid(True, alpha=0.3)
+        ax.legend()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %H:%M'))
+        fig.autofmt_xdate()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
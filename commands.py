@@ -1,5 +1,5 @@
 # commands.py
-from telegram import Update
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
 from telegram.ext import ContextTypes
 import requests
 from datetime import datetime, timedelta
@@ -9,6 +9,18 @@ import json
 import requests
 from typing import Dict, Tuple
 import os
+import time
+import asyncio
+import logging
+import tempfile
+from functools import lru_cache
+from charts import (SERIES_CONFIG, RANGE_CONFIG, get_chart_executor, get_cached_file_id,
+                    cache_file_id, extract_series, render_history_chart)
+from export import EXPORT_FORMATS, DEFAULT_COLUMNS, export_history, parse_date
+from scenario import MAX_GRID_CELLS, compute_reward_grid, parse_list
+from optimizer import optimize_allocation
+from price_aggregator import CMC_QUOTES_URL, cmc_headers, cmc_usd_price, get_price_aggregator
+from outbox import MAX_MESSAGE_LENGTH
 
 POOLS_CONFIG = {
     "stKAIA : (stKAIA-KAIA LP)": {
@@ -51,17 +63,6 @@ def format_number(value):
     else:
         return f"{value:,.2f}"
 
-def get_kaia_price() -> float:
-    """KAIA 토큰의 현재 가격을 가져옴"""
-    try:
-        url = "https://api.swapscanner.io/v1/tokens/prices"
-        response = requests.get(url)
-        response.raise_for_status()
-        kaia_address = "0x0000000000000000000000000000000000000000"
-        return float(response.json().get(kaia_address, 0))
-    except Exception as e:
-        return f"Error fetching KAIA price: {str(e)}"
-    
 def get_kaia_pool_info():
     url = "https://api-portal.kaia.io/api/v1/mission/total"
     try:
@@ -71,11 +72,37 @@ def get_kaia_pool_info():
     except requests.RequestException as e:
         return f"데이터를 가져오는 데 실패했습니다: {str(e)}"
 
-def get_remaining_time():
-    """현재 시각부터 12월 25일 15시까지 남은 시간 계산 (시간 단위)"""
+# 명령어 응답에 사용할 수집기 스냅샷의 최대 나이 (오래되었으면 수집기가 다시 가져옴)
+INTERACTIVE_SNAPSHOT_MAX_AGE = 60
+
+async def get_collector_snapshot(context: ContextTypes.DEFAULT_TYPE, max_age: float = INTERACTIVE_SNAPSHOT_MAX_AGE):
+    """풀 데이터와 가격을 같은 시점에 가져온 수집기 스냅샷 (수집기가 없거나 가져오지 못하면 None)"""
+    collector = context.bot_data.get('collector')
+    if collector is None:
+        return None
+    return await collector.get_fresh_snapshot(max_age)
+
+async def get_pool_data(context: ContextTypes.DEFAULT_TYPE):
+    """풀 데이터 (수집기 스냅샷 우선, 없으면 이벤트 루프 밖에서 직접 조회) - 실패 시 에러 메시지"""
+    snapshot = await get_collector_snapshot(context)
+    if snapshot is not None:
+        return snapshot
+    return await asyncio.to_thread(get_kaia_pool_info)
+
+def get_event_end_time():
     seoul_tz = pytz.timezone('Asia/Seoul')
-    now = datetime.now(seoul_tz)
-    end_time = seoul_tz.localize(datetime(2024, 12, 25, 15, 0, 0))
+    return seoul_tz.localize(datetime(2024, 12, 25, 15, 0, 0))
+
+def get_remaining_time(now=None):
+    """
+    현재 시각부터 12월 25일 15시까지 남은 시간 계산 (시간 단위)
+
+    Args:
+        now: 기준 시각 (timezone-aware datetime). 리플레이에서 시뮬레이션 시계로 사용하며 기본값은 현재 시각
+    """
+    end_time = get_event_end_time()
+    if now is None:
+        now = datetime.now(end_time.tzinfo)
     
     # 시간 차이 계산
     time_diff = end_time - now
@@ -109,20 +136,25 @@ def calculate_reward(my_points, my_points_per_hour, pool_type, total_points, poi
     
     return reward, hourly_reward
 
-async def total_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        data = get_kaia_pool_info()
-        if isinstance(data, str):
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=data,
-                parse_mode='Markdown'
-            )
-            return
+def parse_number(value):
+    """'500M', '2.5B', '10K' 형식의 입력값을 숫자로 변환"""
+    match = re.match(r'^(\d+\.?\d*)(B|M|K)?$', value.upper())
+    if not match:
+        raise ValueError(f"Invalid number format: {value}")
+    num, unit = match.groups()
+    num = float(num)
+    if unit == 'B':
+        return num * 1_000_000_000
+    elif unit == 'M':
+        return num * 1_000_000
+    elif unit == 'K':
+        return num * 1_000
+    return num
 
-        _, time_str = get_remaining_time()
+def build_total_message(data):
+    _, time_str = get_remaining_time()
 
-        message = f"""
+    return f"""
 📊 *KAIA Pool Information*
 
 💫 *Total Points*: {format_number(data['totalPoint'])}
@@ -138,6 +170,59 @@ async def total_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ⏰ Last Updated: {datetime.fromtimestamp(data['updatedAt']).strftime('%Y-%m-%d %H:%M:%S')}
 ⌛ Time Left: {time_str}
 """
+
+def build_tvl_message(data):
+    return f"""
+💰 *KAIA DeFi TVL*
+${format_number(data['defiTvl'])}
+
+⏰ Last Updated: {datetime.fromtimestamp(data['updatedAt']).strftime('%Y-%m-%d %H:%M:%S')}
+"""
+
+def build_calc_message(my_points, my_points_per_hour, data, remaining_hours, time_str):
+    # 일반 풀과 FGP 풀 각각의 보상 계산
+    general_reward, general_hourly = calculate_reward(
+        my_points, my_points_per_hour, "general",
+        data['generalPoint'], data['generalPointPerHour'],
+        remaining_hours
+    )
+
+    fgp_reward, fgp_hourly = calculate_reward(
+        my_points, my_points_per_hour, "fgp",
+        data['fgpPoint'], data['fgpPointPerHour'],
+        remaining_hours
+    )
+
+    return f"""
+🧮 *KAIA Reward Calculator*
+
+💎 *Your Input*
+• Current Points: {format_number(my_points)}
+• Points per Hour: {format_number(my_points_per_hour)}
+
+🏢 *General Pool (15M KAIA)*
+• Hourly Reward: {format_number(general_hourly)} KAIA/hour
+• Total Expected Reward: {format_number(general_reward)} KAIA
+
+🌟 *FGP Pool (22.5M KAIA)*
+• Hourly Reward: {format_number(fgp_hourly)} KAIA/hour
+• Total Expected Reward: {format_number(fgp_reward)} KAIA
+
+⌛ Time Left: {time_str}
+"""
+
+async def total_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        data = await get_pool_data(context)
+        if isinstance(data, str):
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=data,
+                parse_mode='Markdown'
+            )
+            return
+
+        message = build_total_message(data)
         
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -153,7 +238,7 @@ async def total_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def tvl_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        data = get_kaia_pool_info()
+        data = await get_pool_data(context)
         if isinstance(data, str):
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
@@ -162,12 +247,7 @@ async def tvl_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        message = f"""
-💰 *KAIA DeFi TVL*
-${format_number(data['defiTvl'])}
-
-⏰ Last Updated: {datetime.fromtimestamp(data['updatedAt']).strftime('%Y-%m-%d %H:%M:%S')}
-"""
+        message = build_tvl_message(data)
         
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -181,38 +261,133 @@ ${format_number(data['defiTvl'])}
             parse_mode='Markdown'
         )
 
+def parse_hours(value, remaining_hours):
+    """'24', '12h', '7d', 'end'(이벤트 종료까지) 형식을 시간 단위로 변환"""
+    value = value.lower()
+    if value == 'end':
+        return float(remaining_hours)
+    if value.endswith('d'):
+        return parse_number(value[:-1]) * 24
+    if value.endswith('h'):
+        return parse_number(value[:-1])
+    return parse_number(value)
+
+@lru_cache(maxsize=256)
+def _cached_reward_grids(updated_at, general_point, general_pph, fgp_point, fgp_pph,
+                         my_points, rates, horizons, growths):
+    """스냅샷(updatedAt)과 입력별로 General/FGP 보상 그리드를 캐시"""
+    return (
+        compute_reward_grid(my_points, rates, horizons, growths,
+                            general_point, general_pph, 15_000_000),
+        compute_reward_grid(my_points, rates, horizons, growths,
+                            fgp_point, fgp_pph, 22_500_000)
+    )
+
+def format_reward_grid(title, grid, rates, horizons, growths):
+    """그리드를 성장률별 표(행: 시간당 포인트, 열: 남은 시간) 목록으로 변환"""
+    header = "pts/h".ljust(8) + "".join(f"{h:.0f}h".rjust(9) for h in horizons)
+    tables = []
+    for growth, table in zip(growths, grid):
+        rows = [header]
+        for rate, row in zip(rates, table):
+            rows.append(format_number(rate).ljust(8) + "".join(format_number(v).rjust(9) for v in row))
+        tables.append(f"*{title}* - pool growth x{growth:.2f}\n```\n" + "\n".join(rows) + "\n```")
+    return tables
+
+def pack_messages(blocks, limit=MAX_MESSAGE_LENGTH):
+    """블록을 순서대로 길이 제한 안에서 최대한 합쳐 메시지 목록으로 만듦"""
+    messages = []
+    for block in blocks:
+        if messages and len(messages[-1]) + len(block) + 2 <= limit:
+            messages[-1] += "\n\n" + block
+        else:
+            messages.append(block)
+    return messages
+
+async def calc_scenario(update: Update, context: ContextTypes.DEFAULT_TYPE, args):
+    """/calc scenario <my_points> <rates> [hours] [growths] - 예치 속도/남은 시간/풀 성장률 그리드"""
+    if len(args) < 2 or len(args) > 4:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=("Usage: /calc scenario <my_current_points> <points_per_hour,...> [hours,...] [pool_growth,...]\n"
+                  "Example: /calc scenario 500M 1M,2M,4M 7d,14d,end 0.8,1,1.2"),
+        )
+        return
+
+    remaining_hours, time_str = get_remaining_time()
+    # 남은 시간을 기본값('end' 포함)으로 쓰는데 이벤트가 끝났으면 /calc와 같이 안내
+    uses_end = len(args) <= 2 or 'end' in args[2].lower().split(',')
+    if remaining_hours <= 0 and uses_end:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Event has already ended.",
+            parse_mode='Markdown'
+        )
+        return
+
+    # 입력 검증은 풀 데이터 조회 전에 수행
+    my_points = parse_number(args[0])
+    rates = tuple(parse_list(args[1], parse_number))
+    horizons = tuple(parse_list(args[2], lambda v: parse_hours(v, remaining_hours))) \
+        if len(args) > 2 else (float(remaining_hours),)
+    growths = tuple(parse_list(args[3], float)) if len(args) > 3 else (0.8, 1.0, 1.2)
+    if any(h <= 0 for h in horizons):
+        raise ValueError("Hours must be positive")
+    if len(rates) * len(horizons) * len(growths) > MAX_GRID_CELLS:
+        raise ValueError(f"Too many scenarios (max {MAX_GRID_CELLS} combinations)")
+
+    data = await get_pool_data(context)
+    if isinstance(data, str):
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=data,
+            parse_mode='Markdown'
+        )
+        return
+
+    general_grid, fgp_grid = _cached_reward_grids(
+        data['updatedAt'], data['generalPoint'], data['generalPointPerHour'],
+        data['fgpPoint'], data['fgpPointPerHour'],
+        my_points, rates, horizons, growths
+    )
+
+    # 표 하나는 길이 제한 안에 들어가지만 전체는 커질 수 있으므로 여러 메시지로 나눠 보냄
+    blocks = (
+        [f"🧮 *KAIA Reward Scenarios* (current points: {format_number(my_points)})"]
+        + format_reward_grid("🏢 General Pool (15M KAIA)", general_grid, rates, horizons, growths)
+        + format_reward_grid("🌟 FGP Pool (22.5M KAIA)", fgp_grid, rates, horizons, growths)
+        + [f"⌛ Time Left: {time_str}"]
+    )
+
+    for message in pack_messages(blocks):
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=message,
+            parse_mode='Markdown'
+        )
+
 async def calc_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # 입력 파싱
         args = context.args
+        if args and args[0].lower() == 'scenario':
+            await calc_scenario(update, context, args[1:])
+            return
+
         if len(args) != 2:
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
-                text="Usage: /calc <my_current_points> <my_points_per_hour>\nExample: /calc 500M 2M",
+                text=("Usage: /calc <my_current_points> <my_points_per_hour>\nExample: /calc 500M 2M\n"
+                      "Scenarios: /calc scenario <my_current_points> <points_per_hour,...> [hours,...] [pool_growth,...]"),
                 parse_mode='Markdown'
             )
             return
 
-        # 입력값 파싱 함수
-        def parse_number(value):
-            match = re.match(r'^(\d+\.?\d*)(B|M|K)?$', value.upper())
-            if not match:
-                raise ValueError(f"Invalid number format: {value}")
-            num, unit = match.groups()
-            num = float(num)
-            if unit == 'B':
-                return num * 1_000_000_000
-            elif unit == 'M':
-                return num * 1_000_000
-            elif unit == 'K':
-                return num * 1_000
-            return num
-
         my_points = parse_number(args[0])
         my_points_per_hour = parse_number(args[1])
 
         # 현재 풀 정보 가져오기
-        data = get_kaia_pool_info()
+        data = await get_pool_data(context)
         if isinstance(data, str):
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
@@ -232,36 +407,7 @@ async def calc_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        # 일반 풀과 FGP 풀 각각의 보상 계산
-        general_reward, general_hourly = calculate_reward(
-            my_points, my_points_per_hour, "general",
-            data['generalPoint'], data['generalPointPerHour'],
-            remaining_hours
-        )
-
-        fgp_reward, fgp_hourly = calculate_reward(
-            my_points, my_points_per_hour, "fgp",
-            data['fgpPoint'], data['fgpPointPerHour'],
-            remaining_hours
-        )
-
-        message = f"""
-🧮 *KAIA Reward Calculator*
-
-💎 *Your Input*
-• Current Points: {format_number(my_points)}
-• Points per Hour: {format_number(my_points_per_hour)}
-
-🏢 *General Pool (15M KAIA)*
-• Hourly Reward: {format_number(general_hourly)} KAIA/hour
-• Total Expected Reward: {format_number(general_reward)} KAIA
-
-🌟 *FGP Pool (22.5M KAIA)*
-• Hourly Reward: {format_number(fgp_hourly)} KAIA/hour
-• Total Expected Reward: {format_number(fgp_reward)} KAIA
-
-⌛ Time Left: {time_str}
-"""
+        message = build_calc_message(my_points, my_points_per_hour, data, remaining_hours, time_str)
 
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -342,9 +488,52 @@ async def average_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text=f"Error occurred: {str(e)}",
             parse_mode='Markdown'
         )
+def compare_pools(data, general_hourly, fgp_hourly, remaining_hours):
+    """General/FGP 풀 효율 비교 (/compare와 리플레이에서 공통 사용)"""
+    # 시간당 보상 비율 계산
+    general_hourly_reward_ratio = 15_000_000 / general_hourly
+    fgp_hourly_reward_ratio = 22_500_000 / fgp_hourly
+    hourly_ratio = general_hourly_reward_ratio / fgp_hourly_reward_ratio
+    
+    # 총 예상 포인트 계산
+    general_total = data['generalPoint'] + (general_hourly * remaining_hours)
+    fgp_total = data['fgpPoint'] + (fgp_hourly * remaining_hours)
+    
+    # 총 보상 비율 계산
+    general_total_reward_ratio = 15_000_000 / general_total
+    fgp_total_reward_ratio = 22_500_000 / fgp_total
+    total_ratio = general_total_reward_ratio / fgp_total_reward_ratio
+    
+    # 보상 차이 계산
+    Ratio_Flag = 0
+    Ratio_Flag_expect = 0
+    if ((data['generalPoint'] * 1.5 - data['fgpPoint']) > 0):
+        Ratio_Flag = 1
+    else:
+        Ratio_Flag = 2
+    
+    if ((general_total * 1.5 - fgp_total) > 0):
+        Ratio_Flag_expect = 1
+    else:
+        Ratio_Flag_expect = 2
+        
+    Ratio_calc = abs(data['generalPoint'] * 1.5 - data['fgpPoint'])
+    Ratio_calc_expect = abs(general_total * 1.5 - fgp_total)
+
+    return {
+        "hourly_ratio": hourly_ratio,
+        "general_total": general_total,
+        "fgp_total": fgp_total,
+        "total_ratio": total_ratio,
+        "ratio_flag": Ratio_Flag,
+        "ratio_flag_expect": Ratio_Flag_expect,
+        "ratio_calc": Ratio_calc,
+        "ratio_calc_expect": Ratio_calc_expect
+    }
+
 async def compare_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        data = get_kaia_pool_info()
+        data = await get_pool_data(context)
         if isinstance(data, str):
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
@@ -380,35 +569,15 @@ async def compare_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         general_hourly = daily_stats['general_hourly_average']
         fgp_hourly = daily_stats['fgp_hourly_average']
         
-        # 시간당 보상 비율 계산
-        general_hourly_reward_ratio = 15_000_000 / general_hourly
-        fgp_hourly_reward_ratio = 22_500_000 / fgp_hourly
-        hourly_ratio = general_hourly_reward_ratio / fgp_hourly_reward_ratio
-        
-        # 총 예상 포인트 계산
-        general_total = data['generalPoint'] + (general_hourly * remaining_hours)
-        fgp_total = data['fgpPoint'] + (fgp_hourly * remaining_hours)
-        
-        # 총 보상 비율 계산
-        general_total_reward_ratio = 15_000_000 / general_total
-        fgp_total_reward_ratio = 22_500_000 / fgp_total
-        total_ratio = general_total_reward_ratio / fgp_total_reward_ratio
-        
-        # 보상 차이 계산
-        Ratio_Flag = 0
-        Ratio_Flag_expect = 0
-        if ((data['generalPoint'] * 1.5 - data['fgpPoint']) > 0):
-            Ratio_Flag = 1
-        else:
-            Ratio_Flag = 2
-        
-        if ((general_total * 1.5 - fgp_total) > 0):
-            Ratio_Flag_expect = 1
-        else:
-            Ratio_Flag_expect = 2
-            
-        Ratio_calc = abs(data['generalPoint'] * 1.5 - data['fgpPoint'])
-        Ratio_calc_expect = abs(general_total * 1.5 - fgp_total)
+        comparison = compare_pools(data, general_hourly, fgp_hourly, remaining_hours)
+        hourly_ratio = comparison['hourly_ratio']
+        general_total = comparison['general_total']
+        fgp_total = comparison['fgp_total']
+        total_ratio = comparison['total_ratio']
+        Ratio_Flag = comparison['ratio_flag']
+        Ratio_Flag_expect = comparison['ratio_flag_expect']
+        Ratio_calc = comparison['ratio_calc']
+        Ratio_calc_expect = comparison['ratio_calc_expect']
 
         message = f"""
 ⚖️ *Pool Efficiency Comparison*
@@ -452,6 +621,29 @@ Note: Lower ratio indicates better efficiency
             parse_mode='Markdown'
         )
 
+async def get_pool_data_and_price(context: ContextTypes.DEFAULT_TYPE):
+    """
+    풀 데이터와 KAIA 가격을 같은 시점 기준으로 가져옴
+
+    수집기 스냅샷(풀 데이터와 가격 집계기 가격을 한 번에 가져온 것)을 사용하고,
+    수집기가 없거나 스냅샷에 가격이 없을 때만 따로 조회한다.
+
+    Returns:
+        (풀 데이터 또는 에러 메시지, KAIA 가격 또는 None, 가격 출처 설명)
+    """
+    snapshot = await get_collector_snapshot(context)
+    if snapshot and snapshot.get('kaiaPrice'):
+        fetched = datetime.fromtimestamp(snapshot['fetchedAt']).strftime('%H:%M:%S')
+        sources = ", ".join(snapshot.get('kaiaPriceSources', []))
+        return snapshot, snapshot['kaiaPrice'], f"{sources} @ {fetched}"
+
+    pool_data = snapshot or await asyncio.to_thread(get_kaia_pool_info)
+    if isinstance(pool_data, str):
+        return pool_data, None, ""
+    aggregator = get_price_aggregator()
+    kaia_price = await aggregator.get_price()
+    return pool_data, kaia_price, ", ".join(aggregator.last_sources)
+
 def calculate_pool_returns(points_per_dollar: float, pool_data: Dict, kaia_price: float) -> Dict[str, Tuple[float, float]]:
     """
     General과 FGP 풀 각각에 대한 APY와 달러 수익을 계산
@@ -493,7 +685,7 @@ def calculate_pool_returns(points_per_dollar: float, pool_data: Dict, kaia_price
 async def apy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # 현재 풀 데이터 가져오기
-        pool_data = get_kaia_pool_info()
+        pool_data, kaia_price, price_source = await get_pool_data_and_price(context)
         if isinstance(pool_data, str):
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
@@ -501,10 +693,7 @@ async def apy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 parse_mode='Markdown'
             )
             return
-            
-        # KAIA 가격 가져오기
-        kaia_price = get_kaia_price()
-        if kaia_price == 0:
+        if not kaia_price:
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
                 text="Unable to fetch KAIA price",
@@ -516,7 +705,7 @@ async def apy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # FGP Pool 정보 (22.5M KAIA)
         fgp_message = "📊 *FGP POOL ROI (22.5M KAIA)*\n\n"
-        fgp_message += f"💰 *KAIA Price*: ${kaia_price:.4f}\n"
+        fgp_message += f"💰 *KAIA Price*: ${kaia_price:.4f} ({price_source})\n"
         fgp_message += f"⌛ {time_str}\n\n"
         fgp_message += f"📈 *Current Pool Stats*\n"
         fgp_message += f"• Total Points: {format_number(pool_data['fgpPoint'])}\n"
@@ -590,12 +779,108 @@ async def apy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='Markdown'
         )
 
+@lru_cache(maxsize=128)
+def _cached_allocation(updated_at, kaia_price, budget, remaining_hours,
+                       general_final_points, fgp_final_points):
+    """스냅샷(updatedAt)과 가격별로 최적 배분 결과를 캐시"""
+    options = []
+    for pool_name, config in POOLS_CONFIG.items():
+        options.append({
+            "name": pool_name, "reward_pool": "general",
+            "points_per_dollar": config['points_per_dollar'],
+            "pool_final_points": general_final_points, "total_reward": 15_000_000
+        })
+        options.append({
+            "name": pool_name, "reward_pool": "fgp",
+            "points_per_dollar": config['points_per_dollar'],
+            "pool_final_points": fgp_final_points, "total_reward": 22_500_000
+        })
+    return optimize_allocation(budget, options, remaining_hours)
+
+async def optimize_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if len(context.args) != 1:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Usage: /optimize <budget_in_dollars>\nExample: /optimize 100K",
+                parse_mode='Markdown'
+            )
+            return
+        budget = parse_number(context.args[0])
+        if budget <= 0:
+            raise ValueError("Budget must be positive")
+
+        pool_data, kaia_price, _ = await get_pool_data_and_price(context)
+        if isinstance(pool_data, str):
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=pool_data,
+                parse_mode='Markdown'
+            )
+            return
+        if not kaia_price:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Unable to fetch KAIA price",
+                parse_mode='Markdown'
+            )
+            return
+
+        remaining_hours, time_str = get_remaining_time()
+        if remaining_hours <= 0:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Event has already ended.",
+                parse_mode='Markdown'
+            )
+            return
+
+        allocation = _cached_allocation(
+            pool_data['updatedAt'], kaia_price, budget, remaining_hours,
+            pool_data['generalPoint'] + pool_data['generalPointPerHour'] * remaining_hours,
+            pool_data['fgpPoint'] + pool_data['fgpPointPerHour'] * remaining_hours
+        )
+
+        total_kaia = sum(item['reward'] for item in allocation)
+        message = "🎯 *Optimal Allocation*\n\n"
+        message += f"💵 *Budget*: ${format_number(budget)}\n"
+        message += f"💰 *KAIA Price*: ${kaia_price:.4f}\n"
+        message += f"⌛ {time_str}\n"
+        for item in allocation:
+            pool_label = "General Pool (15M KAIA)" if item['reward_pool'] == "general" else "FGP Pool (22.5M KAIA)"
+            message += (
+                f"\n*{item['name']}* → {pool_label}\n"
+                f"• Deposit: ${format_number(item['dollars'])} ({item['dollars'] / budget * 100:.1f}%)\n"
+                f"• Expected: {format_number(item['reward'])} KAIA (${format_number(item['reward'] * kaia_price)})\n"
+            )
+        message += (
+            f"\n📈 *Total Expected*: {format_number(total_kaia)} KAIA (${format_number(total_kaia * kaia_price)})\n"
+            f"• Return: {total_kaia * kaia_price / budget * 100:.2f}%\n\n"
+            "Note: includes dilution from your own deposit"
+        )
+
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=message,
+            parse_mode='Markdown'
+        )
+    except ValueError as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Input error: {str(e)}",
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Error occurred: {str(e)}",
+            parse_mode='Markdown'
+        )
+
 def get_token_prices() -> tuple:
     """Get cmETH and FBTC prices from CoinMarketCap API"""
-    url = "https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest"
-    headers = {
-        'X-CMC_PRO_API_KEY': os.environ.get('CMC_API_KEY')
-    }
+    url = CMC_QUOTES_URL
+    headers = cmc_headers(os.environ.get('CMC_API_KEY'))
     
     params = {
         'symbol': 'CMETH,FBTC',
@@ -605,8 +890,8 @@ def get_token_prices() -> tuple:
     response = requests.get(url, headers=headers, params=params)
     if response.status_code == 200:
         data = response.json()
-        eth_price = float(data['data']['CMETH'][0]['quote']['USD']['price'])
-        btc_price = float(data['data']['FBTC'][0]['quote']['USD']['price'])
+        eth_price = cmc_usd_price(data, 'CMETH')
+        btc_price = cmc_usd_price(data, 'FBTC')
         return eth_price, btc_price
     else:
         raise Exception(f"API request failed with status {response.status_code}")
@@ -631,7 +916,11 @@ def calculate_hf_prices_fbtc(collateral_amount: float, debt_amount: float) -> tu
 
 async def hf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        eth_price, btc_price = get_token_prices()
+        snapshot = await get_collector_snapshot(context)
+        if snapshot and 'cmethPrice' in snapshot and 'fbtcPrice' in snapshot:
+            eth_price, btc_price = snapshot['cmethPrice'], snapshot['fbtcPrice']
+        else:
+            eth_price, btc_price = await asyncio.to_thread(get_token_prices)
         
         # cmETH position
         cmeth_collateral = 92.48
@@ -672,4 +961,359 @@ async def hf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text=f"Error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        series = context.args[0].lower() if len(context.args) > 0 else "rate"
+        range_name = context.args[1].lower() if len(context.args) > 1 else "7d"
+        if len(context.args) > 2 or series not in SERIES_CONFIG or range_name not in RANGE_CONFIG:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=(f"Usage: /history [{'|'.join(SERIES_CONFIG)}] [{'|'.join(RANGE_CONFIG)}]\n"
+                      "Example: /history rate 7d"),
+                parse_mode='Markdown'
+            )
+            return
+
+        collector = context.bot_data.get('collector')
+        if collector is None:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="No history data available.",
+                parse_mode='Markdown'
+            )
+            return
+
+        # 같은 기간/시리즈/데이터 버전이면 이전에 업로드한 이미지를 file_id로 재전송
+        cache_key = (range_name, series, collector.data_version)
+        file_id = get_cached_file_id(cache_key)
+        if file_id:
+            await context.bot.send_photo(chat_id=update.effective_chat.id, photo=file_id)
+            return
+
+        span = RANGE_CONFIG[range_name]
+        start = datetime.now().timestamp() - span if span else None
+        points = collector.get_points(start=start)
+        if len(points) < 2:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=f"Not enough data for {range_name}",
+                parse_mode='Markdown'
+            )
+            return
+
+        title, _ = SERIES_CONFIG[series]
+        timestamps, values = extract_series(points, series)
+
+        # 렌더링은 프로세스 풀에서 수행해 이벤트 루프를 막지 않음
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(
+            get_chart_executor(), render_history_chart,
+            f"{title} ({range_name})", timestamps, values
+        )
+
+        message = await context.bot.send_photo(
+            chat_id=update.effective_chat.id,
+            photo=png,
+            caption=f"{title} - {range_name}, {len(points)} data points"
+        )
+        cache_file_id(cache_key, message.photo[-1].file_id)
+
+    except ImportError:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Chart rendering is unavailable (matplotlib is not installed)",
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Error occurred: {str(e)}",
+            parse_mode='Markdown'
+        )
+
+def is_admin(update: Update) -> bool:
+    """ADMIN_IDS(쉼표 구분) 또는 기본 chat_id에 등록된 사용자인지 확인"""
+    admin_ids = os.environ.get('ADMIN_IDS') or os.environ.get('chat_id') or ''
+    return str(update.effective_user.id) in [i.strip() for i in admin_ids.split(',') if i.strip()]
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if not is_admin(update):
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="This command is only available to admins.",
+                parse_mode='Markdown'
+            )
+            return
+
+        # /export [format] [start] [end] [col1,col2,...]
+        args = context.args
+        fmt = args[0].lower() if len(args) > 0 else 'csv'
+        if len(args) > 4 or fmt not in EXPORT_FORMATS:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=(f"Usage: /export [{'|'.join(EXPORT_FORMATS)}] [start YYYY-MM-DD] [end YYYY-MM-DD] [columns]\n"
+                      f"Columns: {','.join(DEFAULT_COLUMNS)}\n"
+                      "Example: /export csv.gz 2024-11-01 2024-11-30 time,generalPoint,fgpPoint"),
+            )
+            return
+        start = parse_date(args[1]) if len(args) > 1 else None
+        end = parse_date(args[2], end_of_day=True) if len(args) > 2 else None
+        columns = args[3].split(',') if len(args) > 3 else None
+
+        collector = context.bot_data.get('collector')
+        if collector is None:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="No history data available.",
+                parse_mode='Markdown'
+            )
+            return
+
+        filename = f"kaia_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+        os.close(fd)
+        try:
+            # 행을 청크 단위로 파일에 바로 기록 (이벤트 루프 밖에서 실행)
+            count = await asyncio.to_thread(
+                export_history, collector.snapshot_history(), path, fmt, start, end, columns
+            )
+            with open(path, 'rb') as f:
+                await context.bot.send_document(
+                    chat_id=update.effective_chat.id,
+                    document=f,
+                    filename=filename,
+                    caption=f"Exported {count} rows"
+                )
+        finally:
+            os.remove(path)
+
+    except ValueError as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Input error: {str(e)}"
+        )
+    except Exception as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Error occurred: {str(e)}",
+            parse_mode='Markdown'
+        )
+
+async def track_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        store = context.bot_data.get('portfolio_store')
+        if store is None:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Tracking is not available.",
+                parse_mode='Markdown'
+            )
+            return
+
+        args = context.args
+        user_id = update.effective_user.id
+        # 틱 처리 중 저장소 잠금을 기다릴 수 있으므로 DB 작업은 이벤트 루프 밖에서 수행
+        if len(args) == 0:
+            position = await asyncio.to_thread(store.get, user_id)
+            if not position:
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=("Usage: /track <my_current_points> <my_points_per_hour>\nExample: /track 500M 2M\n"
+                          "/untrack to stop, /digest on|off for daily digests"),
+                    parse_mode='Markdown'
+                )
+                return
+        elif len(args) == 2:
+            points, points_per_hour = parse_number(args[0]), parse_number(args[1])
+            await asyncio.to_thread(store.upsert, user_id, update.effective_chat.id, points, points_per_hour)
+            position = await asyncio.to_thread(store.get, user_id)
+        else:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Usage: /track <my_current_points> <my_points_per_hour>\nExample: /track 500M 2M",
+                parse_mode='Markdown'
+            )
+            return
+
+        message = f"""
+📌 *Tracked Position*
+• Points: {format_number(position['points'])}
+• Points per Hour: {format_number(position['points_per_hour'])}
+• Tracking since: {datetime.fromtimestamp(position['tracked_at']).strftime('%Y-%m-%d %H:%M:%S')}
+• Daily digest: {'on' if position['digest'] else 'off'}
+"""
+        if position['projected_at']:
+            message += f"""
+🏢 *General Pool*: {format_number(position['general_reward'])} KAIA
+🌟 *FGP Pool*: {format_number(position['fgp_reward'])} KAIA
+⏰ Projected at: {datetime.fromtimestamp(position['projected_at']).strftime('%Y-%m-%d %H:%M:%S')}
+"""
+        else:
+            message += "\nProjection will be updated on the next data collection."
+
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=message,
+            parse_mode='Markdown'
+        )
+    except ValueError as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Input error: {str(e)}",
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Error occurred: {str(e)}",
+            parse_mode='Markdown'
+        )
+
+async def untrack_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        store = context.bot_data.get('portfolio_store')
+        removed = store is not None and await asyncio.to_thread(store.delete, update.effective_user.id)
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Tracking stopped." if removed else "No tracked position.",
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Error occurred: {str(e)}",
+            parse_mode='Markdown'
+        )
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if len(context.args) != 1 or context.args[0].lower() not in ('on', 'off'):
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Usage: /digest on|off",
+                parse_mode='Markdown'
+            )
+            return
+
+        enabled = context.args[0].lower() == 'on'
+        store = context.bot_data.get('portfolio_store')
+        if store is None or not await asyncio.to_thread(store.set_digest, update.effective_user.id, enabled):
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Track a position first: /track <my_current_points> <my_points_per_hour>",
+                parse_mode='Markdown'
+            )
+            return
+
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Daily digest {'enabled' if enabled else 'disabled'}.",
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"Error occurred: {str(e)}",
+            parse_mode='Markdown'
+        )
+
+# 인라인 쿼리용 스냅샷 캐시 (kaia.io를 키 입력마다 호출하지 않도록 함)
+SNAPSHOT_MAX_AGE = 60
+_snapshot_cache = {"fetched_at": 0.0, "data": None, "answers": None}
+_snapshot_lock = asyncio.Lock()
+
+def _is_snapshot_fresh() -> bool:
+    return (_snapshot_cache["data"] is not None and
+            time.monotonic() - _snapshot_cache["fetched_at"] <= SNAPSHOT_MAX_AGE)
+
+async def get_cached_snapshot():
+    """캐시된 풀 데이터와 스냅샷별로 미리 만든 응답을 반환 (만료 시 한 번만 다시 가져옴)"""
+    if _is_snapshot_fresh():
+        return _snapshot_cache["data"], _snapshot_cache["answers"]
+    async with _snapshot_lock:
+        # 대기하는 동안 다른 요청이 갱신했으면 그 값을 사용
+        if _is_snapshot_fresh():
+            return _snapshot_cache["data"], _snapshot_cache["answers"]
+
+        data = await asyncio.to_thread(get_kaia_pool_info)
+        if isinstance(data, str):
+            # 갱신 실패 시 이전 스냅샷이 있으면 그대로 사용
+            if _snapshot_cache["data"] is None:
+                return data, None
+        else:
+            if (_snapshot_cache["data"] is None or
+                    _snapshot_cache["data"]['updatedAt'] != data['updatedAt']):
+                _snapshot_cache["answers"] = {
+                    "total": build_total_message(data),
+                    "tvl": build_tvl_message(data)
+                }
+            _snapshot_cache["data"] = data
+        _snapshot_cache["fetched_at"] = time.monotonic()
+        return _snapshot_cache["data"], _snapshot_cache["answers"]
+
+@lru_cache(maxsize=1024)
+def _memoized_calc_message(general_point, general_pph, fgp_point, fgp_pph,
+                           my_points, my_points_per_hour, remaining_hours, time_str):
+    """풀 값과 입력별로 /calc 응답을 캐시 (인자만으로 결과가 정해짐)"""
+    data = {
+        'generalPoint': general_point,
+        'generalPointPerHour': general_pph,
+        'fgpPoint': fgp_point,
+        'fgpPointPerHour': fgp_pph
+    }
+    return build_calc_message(my_points, my_points_per_hour, data, remaining_hours, time_str)
+
+def _inline_article(result_id, title, description, text):
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(text, parse_mode='Markdown')
+    )
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """인라인 쿼리 처리 (@kaia_bot total, @kaia_bot tvl, @kaia_bot calc 500M 2M)"""
+    query = update.inline_query
+    args = query.query.split()
+    try:
+        data, answers = await get_cached_snapshot()
+        if answers is None:
+            await query.answer([], cache_time=5)
+            return
+
+        results = []
+        command = args[0].lower() if args else ""
+        if command in ("", "total"):
+            results.append(_inline_article(
+                f"total-{data['updatedAt']}", "KAIA Pool Information",
+                f"Total Points: {format_number(data['totalPoint'])}", answers["total"]))
+        if command in ("", "tvl"):
+            results.append(_inline_article(
+                f"tvl-{data['updatedAt']}", "KAIA DeFi TVL",
+                f"${format_number(data['defiTvl'])}", answers["tvl"]))
+        if command == "calc" and len(args) == 3:
+            # 입력을 숫자로 정규화해 '500M'과 '500000000'이 같은 캐시 항목을 쓰도록 함
+            my_points = parse_number(args[1])
+            my_points_per_hour = parse_number(args[2])
+            remaining_hours, time_str = get_remaining_time()
+            if remaining_hours > 0:
+                message = _memoized_calc_message(
+                    data['generalPoint'], data['generalPointPerHour'],
+                    data['fgpPoint'], data['fgpPointPerHour'],
+                    my_points, my_points_per_hour, remaining_hours, time_str)
+                results.append(_inline_article(
+                    f"calc-{data['updatedAt']}-{my_points:.0f}-{my_points_per_hour:.0f}",
+                    "KAIA Reward Calculator",
+                    f"{format_number(my_points)} points, {format_number(my_points_per_hour)}/hour",
+                    message))
+
+        await query.answer(results, cache_time=SNAPSHOT_MAX_AGE)
+    except ValueError:
+        # 입력 중인 값은 형식이 불완전할 수 있으므로 빈 결과로 응답
+        await query.answer([], cache_time=0)
+    except Exception as e:
+        logging.error(f"Inline query error: {str(e)}")
+        await query.answer([], cache_time=0)
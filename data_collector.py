@@ -5,8 +5,10 @@ import aiohttp
 from datetime import datetime, timedelta
 import os
 import logging
-from typing import Dict, Optional, List
-from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Optional, List, Set
+from persistence import PersistenceWorker
+from price_aggregator import CMC_QUOTES_URL, PriceAggregator, cmc_headers, cmc_usd_price, get_price_aggregator
+from retention import RetentionPolicy, compact, iter_points, summarize_days, calculate_daily_stat
 
 # 로깅 설정
 logging.basicConfig(
@@ -18,21 +20,79 @@ logging.basicConfig(
     ]
 )
 
+class Endpoint:
+    """수집 틱마다 가져올 API와 응답에서 스냅샷 필드를 꺼내는 함수"""
+
+    def __init__(self, name: str, url: str, extract: Callable[[Dict], Dict],
+                 headers: Optional[Dict] = None, params: Optional[Dict] = None,
+                 required: bool = False):
+        self.name = name
+        self.url = url
+        self.extract = extract
+        self.headers = headers or {}
+        self.params = params or {}
+        self.required = required
+
+
+def default_endpoints(api_url: str) -> List[Endpoint]:
+    """mission/total(필수), CMC cmETH/FBTC 시세(CMC_API_KEY가 있을 때) - KAIA 가격은 가격 집계기에서 가져옴"""
+    endpoints = [
+        Endpoint("mission", api_url, lambda data: data['result'], required=True)
+    ]
+
+    cmc_key = os.environ.get('CMC_API_KEY')
+    if cmc_key:
+        endpoints.append(Endpoint(
+            "coinmarketcap",
+            CMC_QUOTES_URL,
+            lambda data: {
+                "cmethPrice": cmc_usd_price(data, 'CMETH'),
+                "fbtcPrice": cmc_usd_price(data, 'FBTC')
+            },
+            headers=cmc_headers(cmc_key),
+            params={'symbol': 'CMETH,FBTC', 'convert': 'USD'}
+        ))
+
+    return endpoints
+
+
 class KAIADataCollector:
     def __init__(self, 
                  data_file: str = 'kaia_pool_data.json',
-                 stats_file: str = 'kaia_daily_stats.json'):
+                 stats_file: str = 'kaia_daily_stats.json',
+                 retention: Optional[RetentionPolicy] = None,
+                 endpoints: Optional[List[Endpoint]] = None,
+                 persistence: Optional[PersistenceWorker] = None,
+                 price_aggregator: Optional[PriceAggregator] = None):
         self.api_url = "https://api-portal.kaia.io/api/v1/mission/total"
+        self.endpoints = endpoints if endpoints is not None else default_endpoints(self.api_url)
+        # KAIA 가격은 명령어와 같은 집계기(여러 소스의 중앙값)를 사용
+        self.price_aggregator = price_aggregator or get_price_aggregator()
+        self.interval_seconds = 3600
+        # 마지막으로 가져온 결합 스냅샷 (틱 또는 명령어 요청 시 갱신, 저장 여부와 관계없음)
+        self.latest_snapshot: Optional[Dict] = None
+        self._refresh_lock = asyncio.Lock()
+        # 틱마다 새 스냅샷으로 호출되는 코루틴 함수 목록
+        self.tick_listeners: List[Callable[[Dict], Awaitable[None]]] = []
         self.data_file = data_file
         self.stats_file = stats_file
+        self.retention = retention or RetentionPolicy()
+        # 파일 쓰기는 전용 스레드에서 처리 (이벤트 루프를 막지 않도록)
+        self.persistence = persistence or PersistenceWorker()
         self.last_data: Optional[Dict] = None
+        self.daily_stats: Dict[str, Dict] = {}
+        # 저장된 데이터가 바뀔 때마다 증가 (차트 캐시 무효화용)
+        self.data_version = 0
         self._initialize_data_file()
         self._initialize_stats_file()
     
     def _initialize_stats_file(self) -> None:
         """통계 파일 초기화"""
         try:
-            if not os.path.exists(self.stats_file):
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r') as f:
+                    self.daily_stats = json.load(f).get('daily_stats', {})
+            else:
                 initial_stats = {
                     "initialized_at": datetime.now().isoformat(),
                     "daily_stats": {}
@@ -59,13 +119,19 @@ class KAIADataCollector:
             logging.error(f"Error initializing data file: {e}")
             self.last_data = {}
 
+    @staticmethod
+    def _empty_history() -> Dict:
+        return {
+            "initialized_at": datetime.now().isoformat(),
+            "data_points": [],
+            "hourly_rollups": [],
+            "daily_rollups": []
+        }
+
     def _create_empty_data_file(self) -> None:
         """빈 데이터 파일 생성"""
         try:
-            initial_data = {
-                "initialized_at": datetime.now().isoformat(),
-                "data_points": []
-            }
+            initial_data = self._empty_history()
             with open(self.data_file, 'w') as f:
                 json.dump(initial_data, f, indent=2)
             self.last_data = initial_data
@@ -85,27 +151,94 @@ class KAIADataCollector:
                         "initialized_at": data.get("initialized_at", datetime.now().isoformat()),
                         "data_points": [data['data']] if 'data' in data else []
                     }
+                data.setdefault('hourly_rollups', [])
+                data.setdefault('daily_rollups', [])
                 self.last_data = data
             logging.info("Existing data loaded successfully")
         except Exception as e:
             logging.error(f"Error loading existing data: {e}")
             self._create_empty_data_file()
 
+    async def _fetch_endpoint(self, session: aiohttp.ClientSession, endpoint: Endpoint) -> Dict:
+        async with session.get(endpoint.url, headers=endpoint.headers, params=endpoint.params) as response:
+            if response.status != 200:
+                raise RuntimeError(f"status {response.status}")
+            return endpoint.extract(await response.json(content_type=None))
+
     async def fetch_data(self) -> Optional[Dict]:
-        """API에서 데이터 가져오기"""
+        """
+        설정된 모든 API를 하나의 세션에서 동시에 가져와 하나의 스냅샷으로 결합
+
+        mission/total 필드를 최상위에 두고 가격 등 다른 소스의 필드와 가격 집계기의
+        KAIA 가격을 합친 뒤 fetchedAt(수집 시각)을 붙인다. 필수 소스가 실패하면 None을 반환한다.
+        """
         try:
+            fetched_at = int(datetime.now().timestamp())
             async with aiohttp.ClientSession() as session:
-                async with session.get(self.api_url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data['result']
-                    else:
-                        logging.error(f"API request failed with status {response.status}")
+                kaia_price, *results = await asyncio.gather(
+                    self.price_aggregator.get_price(),
+                    *(self._fetch_endpoint(session, endpoint) for endpoint in self.endpoints),
+                    return_exceptions=True
+                )
+
+            snapshot: Dict = {}
+            missing = []
+            for endpoint, result in zip(self.endpoints, results):
+                if isinstance(result, Exception):
+                    logging.error(f"API request to {endpoint.name} failed: {result}")
+                    if endpoint.required:
                         return None
+                    missing.append(endpoint.name)
+                    continue
+                snapshot.update(result)
+
+            if isinstance(kaia_price, Exception) or kaia_price is None:
+                logging.error(f"KAIA price unavailable: {kaia_price}")
+                missing.append("price_aggregator")
+            else:
+                snapshot['kaiaPrice'] = kaia_price
+                snapshot['kaiaPriceSources'] = self.price_aggregator.last_sources
+
+            snapshot['fetchedAt'] = fetched_at
+            if missing:
+                snapshot['missingSources'] = missing
+            self.latest_snapshot = snapshot
+            return snapshot
         except Exception as e:
             logging.error(f"Error fetching data: {e}")
             return None
 
+    def add_tick_listener(self, listener: Callable[[Dict], Awaitable[None]]) -> None:
+        self.tick_listeners.append(listener)
+
+    async def _notify_tick_listeners(self, snapshot: Dict) -> None:
+        for listener in self.tick_listeners:
+            try:
+                await listener(snapshot)
+            except Exception as e:
+                logging.error(f"Error in tick listener: {e}")
+
+    def get_latest_snapshot(self, max_age: Optional[float] = None) -> Optional[Dict]:
+        """마지막 스냅샷 (max_age초, 기본값은 수집 주기보다 오래되었으면 None)"""
+        if self.latest_snapshot is None:
+            return None
+        max_age = self.interval_seconds if max_age is None else max_age
+        if datetime.now().timestamp() - self.latest_snapshot['fetchedAt'] > max_age:
+            return None
+        return self.latest_snapshot
+
+    async def get_fresh_snapshot(self, max_age: float) -> Optional[Dict]:
+        """max_age초 이내의 스냅샷 (오래되었으면 모든 소스를 한 번에 다시 가져옴, 실패 시 None)"""
+        snapshot = self.get_latest_snapshot(max_age)
+        if snapshot is not None:
+            return snapshot
+        async with self._refresh_lock:
+            # 대기하는 동안 다른 요청이 갱신했으면 그 값을 사용
+            snapshot = self.get_latest_snapshot(max_age)
+            if snapshot is not None:
+                return snapshot
+            return await self.fetch_data()
+
     def is_data_changed(self, new_data: Dict) -> bool:
         """데이터 변경 여부 확인 - 업데이트 시간이나 시간당 포인트가 변경된 경우"""
         if not self.last_data or not self.last_data.get('data_points'):
@@ -124,76 +257,114 @@ class KAIADataCollector:
         try:
             # 현재 데이터를 데이터 포인트 리스트에 추가
             if not self.last_data:
-                self.last_data = {"initialized_at": datetime.now().isoformat(), "data_points": []}
+                self.last_data = self._empty_history()
             
             self.last_data['data_points'].append(data)
+            self.data_version += 1
             
             # 파일 저장
-            with open(self.data_file, 'w') as f:
-                json.dump(self.last_data, f, indent=2)
+            self._write_data_file()
             
             logging.info(f"Data point saved successfully")
             
-            # 날짜별 통계 업데이트
-            self.update_daily_statistics()
+            # 새 포인트가 속한 날짜의 통계만 업데이트
+            date = datetime.fromtimestamp(data['updatedAt']).strftime('%Y-%m-%d')
+            self.update_daily_statistics(dates={date})
             
         except Exception as e:
             logging.error(f"Error saving data: {e}")
 
-    def update_daily_statistics(self) -> None:
-        """일일 통계 계산 및 저장"""
+    def _write_data_file(self) -> None:
+        """히스토리 스냅샷을 백그라운드 쓰기로 예약"""
+        document = {
+            "initialized_at": self.last_data.get('initialized_at', datetime.now().isoformat()),
+            **self.snapshot_history()
+        }
+        self.persistence.submit(self.data_file, document)
+
+    async def flush(self) -> None:
+        """예약된 파일 쓰기가 모두 끝날 때까지 대기 (기록하지 못한 파일이 있으면 예외)"""
+        await self.persistence.flush()
+
+    def close(self) -> None:
+        """남은 파일 쓰기를 마치고 저장 스레드 종료"""
+        self.persistence.stop()
+
+    def update_daily_statistics(self, dates: Optional[Set[str]] = None) -> None:
+        """
+        일일 통계 계산 및 저장
+
+        Args:
+            dates: 지정하면 해당 날짜만 다시 계산하고 나머지는 기존 통계를 유지
+        """
         try:
-            # 데이터 포인트들을 날짜별로 그룹화
-            daily_data = defaultdict(list)
-            for point in self.last_data['data_points']:
-                date = datetime.fromtimestamp(point['updatedAt']).strftime('%Y-%m-%d')
-                daily_data[date].append(point)
+            # 원본/시간별/일별 티어를 모두 사용해 날짜별 첫/마지막 포인트 계산
+            daily_data = summarize_days(self.last_data, dates)
 
             # 각 날짜별 통계 계산
-            stats = {}
-            for date, points in daily_data.items():
-                if len(points) >= 2:  # 최소 2개 이상의 데이터 포인트가 있어야 변화율 계산 가능
-                    # 정렬된 포인트
-                    sorted_points = sorted(points, key=lambda x: x['updatedAt'])
-                    first_point = sorted_points[0]
-                    last_point = sorted_points[-1]
-                    
-                    # 시간 차이 계산 (시간 단위)
-                    time_diff = (last_point['updatedAt'] - first_point['updatedAt']) / 3600
-                    
-                    if time_diff > 0:
-                        # FGP 풀 변화율 계산
-                        fgp_change = last_point['fgpPoint'] - first_point['fgpPoint']
-                        fgp_rate = fgp_change / time_diff
-                        
-                        # General 풀 변화율 계산
-                        general_change = last_point['generalPoint'] - first_point['generalPoint']
-                        general_rate = general_change / time_diff
-                        
-                        stats[date] = {
-                            "fgp_hourly_average": round(fgp_rate, 2),
-                            "general_hourly_average": round(general_rate, 2),
-                            "time_span_hours": round(time_diff, 2),
-                            "data_points": len(points),
-                            "first_update": datetime.fromtimestamp(first_point['updatedAt']).isoformat(),
-                            "last_update": datetime.fromtimestamp(last_point['updatedAt']).isoformat()
-                        }
-
-            # 통계 저장
-            with open(self.stats_file, 'w') as f:
-                json.dump({
-                    "updated_at": datetime.now().isoformat(),
-                    "daily_stats": stats
-                }, f, indent=2)
+            stats = {} if dates is None else dict(self.daily_stats)
+            for date, (first_point, last_point, count) in daily_data.items():
+                stat = calculate_daily_stat(first_point, last_point, count)
+                if stat:
+                    stats[date] = stat
+            self.daily_stats = stats
+
+            # 통계 저장 (stats는 매번 새로 만드는 딕셔너리이므로 그대로 넘김)
+            self.persistence.submit(self.stats_file, {
+                "updated_at": datetime.now().isoformat(),
+                "daily_stats": stats
+            })
             
             logging.info("Daily statistics updated successfully")
             
         except Exception as e:
             logging.error(f"Error updating daily statistics: {e}")
 
+    def get_points(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Dict]:
+        """기간 내 포인트 조회 - 보관 티어와 관계없이 시간순으로 반환"""
+        if not self.last_data:
+            return []
+        return list(iter_points(self.last_data, start, end))
+
+    def snapshot_history(self) -> Dict:
+        """
+        티어 리스트의 얕은 복사본 반환
+
+        스레드에서 읽는 동안 이벤트 루프의 append/압축이 영향을 주지 않도록 사용
+        """
+        if not self.last_data:
+            return self._empty_history()
+        return {
+            "data_points": list(self.last_data['data_points']),
+            "hourly_rollups": list(self.last_data['hourly_rollups']),
+            "daily_rollups": list(self.last_data['daily_rollups'])
+        }
+
+    async def compact_history(self) -> None:
+        """보관 정책에 따라 오래된 데이터를 롤업으로 압축 (계산은 별도 스레드에서 수행)"""
+        try:
+            if not self.last_data:
+                return
+            snapshot = self.snapshot_history()
+            now = datetime.now().timestamp()
+            result = await asyncio.to_thread(compact, snapshot, self.retention, now)
+            if result is None:
+                return
+
+            # 압축 중에 추가된 포인트는 리스트 뒤쪽에 있으므로 앞부분만 제거
+            del self.last_data['data_points'][:result['raw_consumed']]
+            self.last_data['hourly_rollups'] = result['hourly_rollups']
+            self.last_data['daily_rollups'] = result['daily_rollups']
+            self.data_version += 1
+            self._write_data_file()
+            logging.info(f"History compacted: {result['raw_consumed']} raw points rolled up")
+        except Exception as e:
+            logging.error(f"Error compacting history: {e}")
+
     async def run_collector(self, interval_seconds: int = 3600) -> None:
         """주기적으로 데이터 수집 및 저장"""
         logging.info(f"Starting data collection with {interval_seconds} seconds interval")
+        self.interval_seconds = interval_seconds
         
         while True:
             try:
@@ -204,6 +375,11 @@ class KAIADataCollector:
                     logging.info("New data collected and saved")
                 else:
                     logging.info("No new data to save")
+
+                if new_data:
+                    await self._notify_tick_listeners(new_data)
+
+                await self.compact_history()
                 
                 await asyncio.sleep(interval_seconds)
                 
@@ -0,0 +1,227 @@
+# export.py
+import argparse
+import csv
+import gzip
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from retention import POINT_FIELDS, iter_points
+
+DEFAULT_COLUMNS = ['time', 'tier'] + list(POINT_FIELDS)
+EXPORT_FORMATS = ('csv', 'csv.gz', 'parquet')
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class _JsonStream:
+    """JSON 파일을 일정 크기 버퍼로 읽으며 값 단위로 디코딩하는 스트림"""
+
+    def __init__(self, f, buffer_size: int = 65536):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.buffer_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """공백을 건너뛰고 다음 문자를 반환 (파일 끝이면 빈 문자열)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def next_char(self) -> str:
+        ch = self.peek()
+        self.pos += 1
+        return ch
+
+    def expect(self, ch: str) -> None:
+        actual = self.next_char()
+        if actual != ch:
+            raise ValueError(f"Expected '{ch}' but found '{actual}'")
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # 버퍼 끝에서 끝난 숫자는 잘렸을 수 있으므로 더 읽고 다시 시도
+                if end < len(self.buf) or not self._fill():
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def iter_array(self) -> Iterator:
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            ch = self.next_char()
+            if ch == ']':
+                return
+            if ch != ',':
+                raise ValueError(f"Expected ',' or ']' but found '{ch}'")
+
+
+def iter_json_array(path: str, key: str) -> Iterator[Dict]:
+    """최상위 객체의 배열 필드를 항목 단위로 읽음 - 파일 크기와 관계없이 일정한 메모리 사용"""
+    with open(path, 'r') as f:
+        stream = _JsonStream(f)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            name = stream.decode()
+            stream.expect(':')
+            if stream.peek() == '[':
+                if name == key:
+                    yield from stream.iter_array()
+                    return
+                for _ in stream.iter_array():
+                    pass
+            else:
+                stream.decode()
+            if stream.next_char() != ',':
+                return
+
+
+def open_history_file(path: str) -> Dict[str, Iterator[Dict]]:
+    """데이터 파일의 각 티어를 지연 로딩 이터레이터로 반환 (retention.iter_points에 그대로 사용 가능)"""
+    return {tier: iter_json_array(path, tier)
+            for tier in ('daily_rollups', 'hourly_rollups', 'data_points')}
+
+
+def iter_rows(history: Dict, start: Optional[float] = None, end: Optional[float] = None,
+              columns: Optional[List[str]] = None,
+              chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Dict]]:
+    """
+    히스토리 포인트를 선택한 열만 담은 행으로 변환해 chunk_size 단위로 반환
+
+    Args:
+        history: 수집기의 히스토리 딕셔너리 또는 open_history_file() 결과
+        columns: 출력할 열 (기본값: DEFAULT_COLUMNS)
+    """
+    columns = columns or DEFAULT_COLUMNS
+    unknown = [c for c in columns if c not in DEFAULT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+    chunk = []
+    for point in iter_points(history, start, end):
+        row = {}
+        for column in columns:
+            if column == 'time':
+                row[column] = datetime.fromtimestamp(point['updatedAt']).isoformat()
+            else:
+                row[column] = point.get(column)
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_csv(chunks: Iterator[List[Dict]], columns: List[str], f) -> int:
+    writer = csv.DictWriter(f, fieldnames=columns)
+    writer.writeheader()
+    count = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def _write_parquet(chunks: Iterator[List[Dict]], columns: List[str], output_path: str) -> int:
+    """청크마다 row group 하나씩 기록 (pyarrow 필요)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("parquet export requires pyarrow (use csv.gz instead)")
+
+    schema = pa.schema([(c, pa.string() if c in ('time', 'tier') else pa.float64()) for c in columns])
+    count = 0
+    with pq.ParquetWriter(output_path, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+    return count
+
+
+def export_history(history: Dict, output_path: str, fmt: str = 'csv',
+                   start: Optional[float] = None, end: Optional[float] = None,
+                   columns: Optional[List[str]] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    히스토리를 파일로 내보냄
+
+    Returns:
+        기록한 행 수
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt} (choose from {', '.join(EXPORT_FORMATS)})")
+    columns = columns or DEFAULT_COLUMNS
+    chunks = iter_rows(history, start, end, columns, chunk_size)
+
+    if fmt == 'parquet':
+        return _write_parquet(chunks, columns, output_path)
+    if fmt == 'csv.gz':
+        with gzip.open(output_path, 'wt', newline='') as f:
+            return _write_csv(chunks, columns, f)
+    with open(output_path, 'w', newline='') as f:
+        return _write_csv(chunks, columns, f)
+
+
+def parse_date(value: str, end_of_day: bool = False) -> float:
+    """'YYYY-MM-DD' 또는 ISO 형식 시각을 타임스탬프로 변환"""
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    return parsed.timestamp()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export collected KAIA pool history")
+    parser.add_argument('output', help="output file path")
+    parser.add_argument('--data-file', default='kaia_pool_data.json')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--start', help="YYYY-MM-DD or ISO datetime")
+    parser.add_argument('--end', help="YYYY-MM-DD or ISO datetime")
+    parser.add_argument('--columns', help=f"comma separated ({','.join(DEFAULT_COLUMNS)})")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    count = export_history(
+        open_history_file(args.data_file),
+        args.output,
+        fmt=args.format,
+        start=parse_date(args.start) if args.start else None,
+        end=parse_date(args.end, end_of_day=True) if args.end else None,
+        columns=args.columns.split(',') if args.columns else None,
+        chunk_size=args.chunk_size
+    )
+    print(f"Exported {count} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,13 @@
 # main.py
-import telegram
-from telegram.ext import ApplicationBuilder, CommandHandler
+from telegram.ext import ApplicationBuilder, CommandHandler, InlineQueryHandler
 from dotenv import load_dotenv
 import os
 import asyncio
-from commands import total_command, tvl_command, calc_command, average_command, compare_command, apy_command, hf_command
+from commands import total_command, tvl_command, calc_command, average_command, compare_command, apy_command, hf_command, inline_query_handler, history_command, export_command, optimize_command, track_command, untrack_command, digest_command
 from data_collector import KAIADataCollector
+from charts import shutdown_chart_executor
+from portfolio import PortfolioStore, PortfolioTracker
+from outbox import Outbox, TelegramRateLimiter
 
 # .env 파일 로드
 load_dotenv()
@@ -14,8 +16,11 @@ token = os.environ.get('TELEGRAM_BOT_TOKEN')
 chat_id = os.environ.get('chat_id')
 class TelegramBot:
     def __init__(self, name, token, chat_id):
-        self.core = telegram.Bot(token)
-        self.application = ApplicationBuilder().token(token).build()
+        # 모든 전송은 rate limiter를 거치도록 애플리케이션의 봇을 사용
+        self.application = ApplicationBuilder().token(token).rate_limiter(TelegramRateLimiter()).build()
+        self.core = self.application.bot
+        # 알림/다이제스트 등 여러 채팅으로 보내는 메시지용 큐
+        self.outbox = Outbox(self.core)
         self.id = chat_id
         self.name = name
 
@@ -28,9 +33,13 @@ class TelegramBot:
     def add_handler(self, cmd, func):
         self.application.add_handler(CommandHandler(cmd, func))
 
+    def add_inline_handler(self, func):
+        self.application.add_handler(InlineQueryHandler(func))
+
     async def start(self):
         await self.application.initialize()
         await self.application.start()
+        self.outbox.start()
         await self.application.updater.start_polling()
 
 async def main():
@@ -43,16 +52,39 @@ async def main():
     kaia_bot.add_handler("compare", compare_command)
     kaia_bot.add_handler("apy", apy_command)
     kaia_bot.add_handler("hf", hf_command)
+    kaia_bot.add_handler("optimize", optimize_command)
+    kaia_bot.add_handler("track", track_command)
+    kaia_bot.add_handler("untrack", untrack_command)
+    kaia_bot.add_handler("digest", digest_command)
+    kaia_bot.add_handler("history", history_command)
+    kaia_bot.add_handler("export", export_command)
+    kaia_bot.add_inline_handler(inline_query_handler)
 
     # 데이터 수집기 초기화
     collector = KAIADataCollector()
+    # 핸들러에서 수집된 히스토리에 접근할 수 있도록 등록
+    kaia_bot.application.bot_data['collector'] = collector
+
+    # 사용자별 추적 포지션 - 수집 틱마다 예상 보상 재계산
+    portfolio_store = PortfolioStore()
+    kaia_bot.application.bot_data['portfolio_store'] = portfolio_store
+
+    async def send_digest(chat_id, text):
+        await kaia_bot.outbox.send(chat_id, text, parse_mode='Markdown')
+
+    tracker = PortfolioTracker(portfolio_store, send_digest)
+    collector.add_tick_listener(tracker.on_tick)
 
     # 봇과 데이터 수집기를 동시에 실행
-    await asyncio.gather(
-        kaia_bot.start(),
-        collector.run_collector(interval_seconds=3600),  # 1시간마다 데이터 수집
-        return_exceptions=True
-    )
+    try:
+        await asyncio.gather(
+            kaia_bot.start(),
+            collector.run_collector(interval_seconds=3600),  # 1시간마다 데이터 수집
+            return_exceptions=True
+        )
+    finally:
+        shutdown_chart_executor()
+        collector.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
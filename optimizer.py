@@ -0,0 +1,86 @@
+# optimizer.py
+import math
+from typing import Dict, List
+
+BISECTION_STEPS = 100
+
+
+def expected_reward(dollars: float, points_per_dollar: float, hours: float,
+                    pool_final_points: float, total_reward: float) -> float:
+    """
+    내 예치로 풀 포인트가 늘어나는 희석 효과를 반영한 예상 보상
+
+    my_points = dollars * points_per_dollar * hours
+    reward = my_points / (pool_final_points + my_points) * total_reward
+    """
+    my_points = dollars * points_per_dollar * hours
+    if my_points <= 0:
+        return 0.0
+    return my_points / (pool_final_points + my_points) * total_reward
+
+
+def optimize_allocation(budget: float, options: List[Dict], hours: float) -> List[Dict]:
+    """
+    예산을 풀 구성에 나눠 예상 KAIA 보상 합을 최대화
+
+    보상 풀(General/FGP)마다 보상 함수가 오목하므로, 각 풀의 한계 보상이 같아지는 지점을
+    λ에 대한 이분 탐색으로 찾는다 (water-filling). 같은 보상 풀 안에서는 포인트가 서로
+    구분되지 않으므로 달러당 포인트가 가장 높은 구성만 사용한다.
+
+    Args:
+        options: name, reward_pool, points_per_dollar, pool_final_points, total_reward 키를 가진 목록
+        hours: 보상 계산에 사용할 남은 시간
+
+    Returns:
+        각 보상 풀에 배정된 구성별 name, reward_pool, dollars, reward 목록 (배정액 내림차순)
+    """
+    if budget <= 0 or hours <= 0 or not options:
+        return []
+
+    # 보상 풀별로 달러당 포인트가 가장 높은 구성 선택
+    best: Dict[str, Dict] = {}
+    for option in options:
+        current = best.get(option['reward_pool'])
+        if current is None or option['points_per_dollar'] > current['points_per_dollar']:
+            best[option['reward_pool']] = option
+    candidates = list(best.values())
+
+    # f(x) = R*u*x / (D + u*x), f'(x) = R*u*D / (D + u*x)^2, u = 달러당 총 포인트
+    def allocation(option: Dict, lam: float) -> float:
+        u = option['points_per_dollar'] * hours
+        d = option['pool_final_points']
+        r = option['total_reward']
+        return max(0.0, (math.sqrt(r * u * d / lam) - d) / u)
+
+    low = 0.0
+    high = max(o['total_reward'] * o['points_per_dollar'] * hours / o['pool_final_points']
+               for o in candidates)
+    for _ in range(BISECTION_STEPS):
+        lam = (low + high) / 2
+        if lam <= 0:
+            break
+        spent = sum(allocation(o, lam) for o in candidates)
+        if spent > budget:
+            low = lam
+        else:
+            high = lam
+
+    dollars = [allocation(o, high) for o in candidates]
+    # 이분 탐색 오차로 남은 예산은 비율대로 분배
+    spent = sum(dollars)
+    if spent > 0:
+        dollars = [d * budget / spent for d in dollars]
+
+    results = []
+    for option, amount in zip(candidates, dollars):
+        if amount <= 0:
+            continue
+        results.append({
+            "name": option['name'],
+            "reward_pool": option['reward_pool'],
+            "dollars": amount,
+            "reward": expected_reward(amount, option['points_per_dollar'], hours,
+                                      option['pool_final_points'], option['total_reward'])
+        })
+    results.sort(key=lambda r: r['dollars'], reverse=True)
+    return results
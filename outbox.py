@@ -0,0 +1,229 @@
+# outbox.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+INTERACTIVE = 0
+BROADCAST = 1
+
+# 텔레그램 전송 제한
+GLOBAL_RATE = 30            # 전체 초당 메시지
+PRIVATE_CHAT_RATE = 1       # 개인 채팅 초당 메시지
+GROUP_CHAT_RATE = 20 / 60   # 그룹 채팅 초당 메시지 (분당 20개)
+CHAT_BURST = 3
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """토큰을 하나 얻을 수 있을 때까지 남은 시간 (0이면 바로 가능)"""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    # 라이브러리 버전에 따라 int 또는 timedelta
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """
+    텔레그램 전송 제한에 맞춘 토큰 버킷 rate limiter
+
+    채팅 대상 요청은 전체 버킷과 채팅별 버킷을 모두 통과해야 하며, 일반 명령 응답
+    (INTERACTIVE)이 전체 버킷을 기다리는 동안에는 BROADCAST 요청이 전체 토큰을 가져가지 않는다.
+    우선순위는 rate_limit_args로 지정하고 기본값은 INTERACTIVE이다.
+    429(RetryAfter)를 받으면 해당 채팅(또는 전체)을 지정 시간 동안 멈추고 재시도한다.
+    """
+
+    def __init__(self, max_retries: int = 3):
+        self.max_retries = max_retries
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._blocked_until: Dict[Optional[Union[int, str]], float] = {}
+        self._interactive_waiting = 0
+        self._last_prune = time.monotonic()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = (isinstance(chat_id, int) and chat_id < 0) or \
+                       (isinstance(chat_id, str) and chat_id.startswith('@'))
+            bucket = TokenBucket(GROUP_CHAT_RATE if is_group else PRIVATE_CHAT_RATE, CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self) -> None:
+        """가득 찬(오래 쓰이지 않은) 채팅 버킷 정리"""
+        now = time.monotonic()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for chat_id in [c for c, b in self._chats.items() if b.is_idle()]:
+            del self._chats[chat_id]
+
+    async def _acquire(self, chat_id: Union[int, str], priority: int) -> None:
+        chat_bucket = self._chat_bucket(chat_id)
+        waiting_global = False
+        try:
+            while True:
+                now = time.monotonic()
+                blocked = max(self._blocked_until.get(None, 0), self._blocked_until.get(chat_id, 0)) - now
+                wait = max(blocked, chat_bucket.wait_time())
+                if wait > 0:
+                    # 자기 채팅 제한을 기다리는 동안에는 다른 요청의 전체 토큰 사용을 막지 않음
+                    if waiting_global:
+                        self._interactive_waiting -= 1
+                        waiting_global = False
+                    await asyncio.sleep(wait)
+                    continue
+
+                if priority == INTERACTIVE and not waiting_global:
+                    self._interactive_waiting += 1
+                    waiting_global = True
+                wait = self._global.wait_time()
+                if wait <= 0 and (priority == INTERACTIVE or self._interactive_waiting == 0):
+                    chat_bucket.consume()
+                    self._global.consume()
+                    return
+                await asyncio.sleep(max(wait, 0.01))
+        finally:
+            if waiting_global:
+                self._interactive_waiting -= 1
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get('chat_id')
+        priority = BROADCAST if rate_limit_args == BROADCAST else INTERACTIVE
+
+        attempt = 0
+        while True:
+            # getUpdates, answerInlineQuery 등 채팅 대상이 아닌 요청은 제한하지 않음
+            if chat_id is not None:
+                self._prune()
+                await self._acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                delay = _retry_after_seconds(e)
+                # 채팅이 없는 요청의 429는 전체 제한으로 간주
+                self._blocked_until[chat_id] = time.monotonic() + delay
+                logging.warning(f"Flood limit hit for {endpoint} (chat {chat_id}), retry after {delay}s")
+                if attempt > self.max_retries:
+                    raise
+                await asyncio.sleep(delay)
+
+
+class Outbox:
+    """
+    브로드캐스트(알림, 다이제스트) 전송 큐
+
+    같은 채팅에 쌓인 메시지는 길이 제한 안에서 하나로 합쳐 보내며, 채팅별로 순서를 유지한다.
+    실제 전송 속도는 TelegramRateLimiter가 BROADCAST 우선순위로 제어한다.
+    """
+
+    def __init__(self, bot, workers: int = 16):
+        self.bot = bot
+        self.workers = workers
+        self._pending: "OrderedDict[Union[int, str], List[Tuple[str, Optional[str], asyncio.Future]]]" = OrderedDict()
+        self._active = set()
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def send(self, chat_id: Union[int, str], text: str, parse_mode: Optional[str] = None) -> None:
+        """메시지를 큐에 넣고 전송될 때까지 대기"""
+        future = asyncio.get_running_loop().create_future()
+        queued = self._pending.setdefault(chat_id, [])
+        queued.append((text, parse_mode, future))
+        if len(queued) == 1 and chat_id not in self._active:
+            self._ready.put_nowait(chat_id)
+        await future
+
+    async def flush(self) -> None:
+        """큐에 있는 메시지가 모두 처리될 때까지 대기"""
+        await self._ready.join()
+
+    @staticmethod
+    def _merge(queued: List[Tuple[str, Optional[str], asyncio.Future]]) -> List[Tuple[str, Optional[str], List[asyncio.Future]]]:
+        """연속된 같은 parse_mode 메시지를 길이 제한 안에서 합침"""
+        merged = []
+        for text, parse_mode, future in queued:
+            if merged:
+                last_text, last_mode, futures = merged[-1]
+                if last_mode == parse_mode and len(last_text) + len(text) + 2 <= MAX_MESSAGE_LENGTH:
+                    merged[-1] = (f"{last_text}\n\n{text}", parse_mode, futures + [future])
+                    continue
+            merged.append((text, parse_mode, [future]))
+        return merged
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._ready.get()
+            self._active.add(chat_id)
+            try:
+                queued = self._pending.pop(chat_id, [])
+                for text, parse_mode, futures in self._merge(queued):
+                    try:
+                        await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode,
+                                                    rate_limit_args=BROADCAST)
+                        for future in futures:
+                            if not future.done():
+                                future.set_result(None)
+                    except Exception as e:
+                        logging.error(f"Error sending to {chat_id}: {e}")
+                        for future in futures:
+                            if not future.done():
+                                future.set_exception(e)
+            finally:
+                self._active.discard(chat_id)
+                # 전송 중에 새로 쌓인 메시지가 있으면 다시 대기열에 넣음
+                if self._pending.get(chat_id):
+                    self._ready.put_nowait(chat_id)
+                self._ready.task_done()
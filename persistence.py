@@ -0,0 +1,154 @@
+# persistence.py
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def atomic_write_json(path: str, data: Dict) -> None:
+    """임시 파일에 기록한 뒤 rename으로 교체 - 중간에 실패해도 기존 파일이 깨지지 않음"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class PersistenceWorker:
+    """
+    전용 스레드에서 JSON 파일을 기록하는 write-behind 저장기
+
+    같은 파일에 대한 대기 중인 쓰기는 마지막 것만 남기고(group commit), commit_delay 동안
+    들어온 쓰기를 모아 한 번에 기록한다. 직렬화와 디스크 I/O가 모두 이 스레드에서 일어나므로
+    submit()에 넘기는 데이터는 이후 수정되지 않는 스냅샷이어야 한다.
+
+    쓰기에 실패한 파일은 같은 경로에 다음 쓰기가 성공할 때까지 실패 상태로 남으며,
+    그동안 flush()는 마지막 예외를 던지고 flush_sync()는 False를 반환한다.
+    """
+
+    def __init__(self, commit_delay: float = 0.1):
+        self.commit_delay = commit_delay
+        self._pending: Dict[str, Dict] = {}
+        self._submitted = 0
+        self._completed = 0
+        self._waiters: List[Tuple[int, Callable[[Optional[Exception]], None]]] = []
+        # 경로 -> 마지막 쓰기 실패 예외 (성공하면 제거)
+        self._failed: Dict[str, Exception] = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="persistence-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, data: Dict) -> None:
+        """파일 쓰기 예약 (바로 반환)"""
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Persistence worker is stopped")
+            self._pending[path] = data
+            self._submitted += 1
+            self._cond.notify()
+
+    async def flush(self) -> None:
+        """
+        지금까지 예약된 쓰기가 모두 디스크에 기록될 때까지 대기 (이벤트 루프를 막지 않음)
+
+        기록하지 못한 파일이 있으면 마지막 쓰기 예외를 던진다.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(error: Optional[Exception]) -> None:
+            if future.done():
+                return
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+        def resolve(error: Optional[Exception]) -> None:
+            loop.call_soon_threadsafe(settle, error)
+
+        with self._cond:
+            if self._completed >= self._submitted:
+                error = self._last_error()
+                if error is not None:
+                    raise error
+                return
+            self._waiters.append((self._submitted, resolve))
+        await future
+
+    def flush_sync(self, timeout: float = None) -> bool:
+        """동기 버전 flush (종료 시점 등 이벤트 루프 밖에서 사용, 시간 초과나 쓰기 실패 시 False)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted
+            while self._completed < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._failed
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """대기 중인 쓰기를 모두 기록하고 스레드 종료"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _last_error(self) -> Optional[Exception]:
+        return next(reversed(self._failed.values()), None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending and self._stopping:
+                    return
+
+            # 잠시 기다려 연달아 들어오는 쓰기를 한 번에 처리
+            if self.commit_delay and not self._stopping:
+                time.sleep(self.commit_delay)
+
+            with self._cond:
+                batch = self._pending
+                self._pending = {}
+                batch_seq = self._submitted
+
+            results: Dict[str, Optional[Exception]] = {}
+            for path, data in batch.items():
+                try:
+                    atomic_write_json(path, data)
+                    results[path] = None
+                except Exception as e:
+                    logging.error(f"Error writing {path}: {e}")
+                    results[path] = e
+
+            with self._cond:
+                for path, error in results.items():
+                    self._failed.pop(path, None)
+                    if error is not None:
+                        self._failed[path] = error
+                self._completed = batch_seq
+                error = self._last_error()
+                ready = [resolve for target, resolve in self._waiters if target <= batch_seq]
+                self._waiters = [(target, resolve) for target, resolve in self._waiters if target > batch_seq]
+                self._cond.notify_all()
+            for resolve in ready:
+                try:
+                    resolve(error)
+                except RuntimeError:
+                    # 대기하던 이벤트 루프가 이미 닫힌 경우
+                    pass
@@ -0,0 +1,182 @@
+# portfolio.py
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from commands import format_number, get_remaining_time
+
+DIGEST_INTERVAL_SECONDS = 24 * 3600
+
+
+class PortfolioStore:
+    """사용자별 추적 포지션 저장소 (SQLite)"""
+
+    def __init__(self, db_file: str = 'kaia_portfolios.db'):
+        self.db_file = db_file
+        # 틱 처리 시 스레드에서도 사용하므로 연결을 공유하고 잠금으로 직렬화
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._initialize()
+
+    def _initialize(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS positions (
+                    user_id INTEGER PRIMARY KEY,
+                    chat_id INTEGER NOT NULL,
+                    points REAL NOT NULL,
+                    points_per_hour REAL NOT NULL,
+                    tracked_at REAL NOT NULL,
+                    digest INTEGER NOT NULL DEFAULT 0,
+                    last_digest_at REAL,
+                    general_reward REAL,
+                    fgp_reward REAL,
+                    projected_at REAL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_positions_digest ON positions (digest, last_digest_at)"
+            )
+
+    def upsert(self, user_id: int, chat_id: int, points: float, points_per_hour: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO positions (user_id, chat_id, points, points_per_hour, tracked_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    chat_id = excluded.chat_id,
+                    points = excluded.points,
+                    points_per_hour = excluded.points_per_hour,
+                    tracked_at = excluded.tracked_at,
+                    general_reward = NULL,
+                    fgp_reward = NULL,
+                    projected_at = NULL
+            """, (user_id, chat_id, points, points_per_hour, time.time()))
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM positions WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, user_id: int) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM positions WHERE user_id = ?", (user_id,)).rowcount > 0
+
+    def set_digest(self, user_id: int, enabled: bool) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE positions SET digest = ? WHERE user_id = ?", (int(enabled), user_id)
+            ).rowcount > 0
+
+    def load_positions(self) -> List[Tuple[int, float, float, float]]:
+        """(user_id, points, points_per_hour, tracked_at) 전체 목록"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, points, points_per_hour, tracked_at FROM positions"
+            ).fetchall()
+
+    def save_projections(self, projections: List[Tuple[float, float, float, int]]) -> None:
+        """(general_reward, fgp_reward, projected_at, user_id) 목록을 한 트랜잭션으로 기록"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE positions SET general_reward = ?, fgp_reward = ?, projected_at = ? WHERE user_id = ?",
+                projections
+            )
+
+    def due_digests(self, now: float) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT * FROM positions
+                WHERE digest = 1 AND projected_at IS NOT NULL
+                  AND (last_digest_at IS NULL OR last_digest_at <= ?)
+            """, (now - DIGEST_INTERVAL_SECONDS,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_digested(self, user_ids: List[int], now: float) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE positions SET last_digest_at = ? WHERE user_id = ?",
+                [(now, user_id) for user_id in user_ids]
+            )
+
+
+def project_positions(positions: List[Tuple[int, float, float, float]], snapshot: Dict,
+                      remaining_hours: float, now: float) -> List[Tuple[float, float, float, int]]:
+    """
+    모든 포지션의 예상 보상을 한 번에 계산 (calculate_reward와 같은 모델)
+
+    풀의 종료 시점 포인트는 모든 사용자에게 같으므로 한 번만 계산하고, 사용자마다
+    추적 시작 이후 쌓인 포인트를 더한 종료 시점 포인트에 계수만 곱한다.
+    """
+    general_inv = 15_000_000 / (snapshot['generalPoint'] + snapshot['generalPointPerHour'] * remaining_hours)
+    fgp_inv = 22_500_000 / (snapshot['fgpPoint'] + snapshot['fgpPointPerHour'] * remaining_hours)
+    end_hours = remaining_hours + now / 3600
+
+    projections = []
+    for user_id, points, points_per_hour, tracked_at in positions:
+        final_points = points + points_per_hour * (end_hours - tracked_at / 3600)
+        projections.append((final_points * general_inv, final_points * fgp_inv, now, user_id))
+    return projections
+
+
+def build_digest_message(position: Dict) -> str:
+    return f"""
+📬 *Daily Reward Digest*
+
+💎 *Tracked Position*
+• Points at tracking: {format_number(position['points'])}
+• Points per Hour: {format_number(position['points_per_hour'])}
+
+🏢 *General Pool (15M KAIA)*: {format_number(position['general_reward'])} KAIA
+🌟 *FGP Pool (22.5M KAIA)*: {format_number(position['fgp_reward'])} KAIA
+"""
+
+
+class PortfolioTracker:
+    """수집기 틱마다 추적 중인 모든 포지션의 예상 보상을 다시 계산하고 다이제스트 전송"""
+
+    def __init__(self, store: PortfolioStore,
+                 send: Callable[[int, str], Awaitable[None]]):
+        self.store = store
+        self.send = send
+        self._digest_task: Optional[asyncio.Task] = None
+
+    async def on_tick(self, snapshot: Dict) -> None:
+        remaining_hours, _ = get_remaining_time()
+        if remaining_hours <= 0:
+            return
+
+        started = time.perf_counter()
+        now = time.time()
+        # DB 읽기/계산/쓰기는 이벤트 루프 밖에서 수행
+        count = await asyncio.to_thread(self._recompute, snapshot, remaining_hours, now)
+        logging.info(f"Recomputed {count} tracked positions in {time.perf_counter() - started:.3f}s")
+
+        # 다이제스트 전송은 틱을 붙잡지 않도록 백그라운드에서 진행 (이전 전송이 끝나지 않았으면 건너뜀)
+        if self._digest_task is None or self._digest_task.done():
+            self._digest_task = asyncio.create_task(self._send_digests(now))
+
+    def _recompute(self, snapshot: Dict, remaining_hours: float, now: float) -> int:
+        positions = self.store.load_positions()
+        self.store.save_projections(project_positions(positions, snapshot, remaining_hours, now))
+        return len(positions)
+
+    async def _send_digests(self, now: float) -> None:
+        due = await asyncio.to_thread(self.store.due_digests, now)
+        # 모두 한꺼번에 큐에 넣어 전송 속도는 outbox/rate limiter가 조절하도록 함
+        results = await asyncio.gather(
+            *(self.send(position['chat_id'], build_digest_message(position)) for position in due),
+            return_exceptions=True
+        )
+        sent = []
+        for position, result in zip(due, results):
+            if isinstance(result, Exception):
+                logging.error(f"Error sending digest to {position['user_id']}: {result}")
+            else:
+                sent.append(position['user_id'])
+        if sent:
+            await asyncio.to_thread(self.store.mark_digested, sent, now)
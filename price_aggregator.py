@@ -0,0 +1,222 @@
+# price_aggregator.py
+import asyncio
+import logging
+import os
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+KAIA_ADDRESS = "0x0000000000000000000000000000000000000000"
+SWAPSCANNER_PRICES_URL = "https://api.swapscanner.io/v1/tokens/prices"
+CMC_QUOTES_URL = "https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest"
+
+
+def cmc_headers(api_key: str) -> Dict:
+    return {'X-CMC_PRO_API_KEY': api_key}
+
+
+def cmc_usd_price(data: Dict, symbol: str) -> float:
+    """CoinMarketCap quotes 응답에서 심볼의 USD 가격 조회"""
+    return float(data['data'][symbol][0]['quote']['USD']['price'])
+
+
+class PriceSource:
+    """가격 소스 설정: 요청 URL과 응답 JSON에서 가격을 꺼내는 함수"""
+
+    def __init__(self, name: str, url: str, extract: Callable[[Dict], float],
+                 headers: Optional[Dict] = None, params: Optional[Dict] = None):
+        self.name = name
+        self.url = url
+        self.extract = extract
+        self.headers = headers or {}
+        self.params = params or {}
+
+
+class SourceHealth:
+    """소스별 상태 기록"""
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.avg_latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_success_at: Optional[float] = None
+
+    def record_success(self, latency: float) -> None:
+        self.successes += 1
+        self.last_success_at = time.time()
+        # 지수 이동 평균
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+    def record_failure(self, error: str) -> None:
+        self.failures += 1
+        self.last_error = error
+
+    def as_dict(self) -> Dict:
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "avg_latency": self.avg_latency,
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at
+        }
+
+
+def _get_path(data: Dict, path: str):
+    """'a.b.0.c' 형식의 경로로 JSON 값 조회"""
+    for key in path.split('.'):
+        data = data[int(key)] if isinstance(data, list) else data[key]
+    return data
+
+
+def default_sources() -> List[PriceSource]:
+    """
+    환경 변수로 구성한 가격 소스 목록
+
+    - swapscanner: 항상 사용
+    - CoinMarketCap: CMC_API_KEY가 있을 때
+    - DEX 풀 시세: KAIA_PRICE_DEX_URL, KAIA_PRICE_DEX_FIELD(응답 JSON 경로)가 있을 때
+    """
+    sources = [
+        PriceSource("swapscanner", SWAPSCANNER_PRICES_URL, lambda data: float(data[KAIA_ADDRESS]))
+    ]
+
+    cmc_key = os.environ.get('CMC_API_KEY')
+    if cmc_key:
+        sources.append(PriceSource(
+            "coinmarketcap",
+            CMC_QUOTES_URL,
+            lambda data: cmc_usd_price(data, 'KAIA'),
+            headers=cmc_headers(cmc_key),
+            params={'symbol': 'KAIA', 'convert': 'USD'}
+        ))
+
+    dex_url = os.environ.get('KAIA_PRICE_DEX_URL')
+    dex_field = os.environ.get('KAIA_PRICE_DEX_FIELD')
+    if dex_url and dex_field:
+        sources.append(PriceSource("dex", dex_url, lambda data: float(_get_path(data, dex_field))))
+
+    return sources
+
+
+class PriceAggregator:
+    """
+    여러 소스에 동시에 요청하고 제한 시간 안에 응답한 가격들의 중앙값을 반환
+
+    각 소스는 hedge_delay 안에 응답이 없거나 실패하면 같은 요청을 한 번 더 보내고
+    먼저 성공한 응답을 사용한다 (hedged request).
+    """
+
+    def __init__(self, sources: Optional[List[PriceSource]] = None,
+                 budget_seconds: float = 2.0,
+                 hedge_delay: float = 0.5,
+                 cache_ttl: float = 30.0):
+        self.sources = sources if sources is not None else default_sources()
+        self.budget_seconds = budget_seconds
+        self.hedge_delay = hedge_delay
+        self.cache_ttl = cache_ttl
+        self.health: Dict[str, SourceHealth] = {s.name: SourceHealth() for s in self.sources}
+        self._cached_price: Optional[float] = None
+        self._cached_sources: List[str] = []
+        self._cached_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get_price(self) -> Optional[float]:
+        """KAIA 가격 (모든 소스가 실패하면 None)"""
+        if self._is_fresh():
+            return self._cached_price
+        async with self._lock:
+            # 대기하는 동안 다른 요청이 갱신했으면 그 값을 사용
+            if self._is_fresh():
+                return self._cached_price
+
+            prices = await self._fetch_all()
+            if not prices:
+                logging.error("All KAIA price sources failed")
+                return None
+
+            self._cached_price = statistics.median(prices.values())
+            self._cached_sources = sorted(prices)
+            self._cached_at = time.monotonic()
+            return self._cached_price
+
+    @property
+    def last_sources(self) -> List[str]:
+        """마지막 가격 계산에 사용된 소스 이름"""
+        return list(self._cached_sources)
+
+    def _is_fresh(self) -> bool:
+        return (self._cached_price is not None and
+                time.monotonic() - self._cached_at < self.cache_ttl)
+
+    async def _fetch_all(self) -> Dict[str, float]:
+        timeout = aiohttp.ClientTimeout(total=self.budget_seconds)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            tasks = {asyncio.create_task(self._hedged_fetch(session, source)): source
+                     for source in self.sources}
+            done, pending = await asyncio.wait(tasks, timeout=self.budget_seconds)
+            for task in pending:
+                task.cancel()
+                self.health[tasks[task].name].timeouts += 1
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        prices = {}
+        for task in done:
+            if not task.cancelled() and task.exception() is None:
+                prices[tasks[task].name] = task.result()
+        return prices
+
+    async def _hedged_fetch(self, session: aiohttp.ClientSession, source: PriceSource) -> float:
+        attempts = {asyncio.create_task(self._fetch(session, source))}
+        hedged = False
+        try:
+            while True:
+                timeout = None if hedged else self.hedge_delay
+                done, attempts = await asyncio.wait(attempts, timeout=timeout,
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+
+                if not hedged:
+                    # 응답이 늦거나 실패했으면 같은 요청을 한 번 더 보냄
+                    attempts.add(asyncio.create_task(self._fetch(session, source)))
+                    hedged = True
+                elif not attempts:
+                    raise last_error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _fetch(self, session: aiohttp.ClientSession, source: PriceSource) -> float:
+        started = time.monotonic()
+        try:
+            async with session.get(source.url, headers=source.headers, params=source.params) as response:
+                response.raise_for_status()
+                price = source.extract(await response.json(content_type=None))
+            if price <= 0:
+                raise ValueError(f"Invalid price: {price}")
+            self.health[source.name].record_success(time.monotonic() - started)
+            return price
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.health[source.name].record_failure(str(e))
+            raise
+
+
+_aggregator: Optional[PriceAggregator] = None
+
+
+def get_price_aggregator() -> PriceAggregator:
+    """프로세스 전체에서 공유하는 가격 집계기"""
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = PriceAggregator()
+    return _aggregator
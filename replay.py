@@ -0,0 +1,169 @@
+# replay.py
+import argparse
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from commands import calculate_reward, compare_pools, get_event_end_time, get_remaining_time, parse_number
+from export import open_history_file
+from retention import calculate_daily_stat, iter_points
+
+DEFAULT_REFERENCE_RATE = 1_000_000  # 보상 예측 검증에 사용할 가상 사용자의 시간당 포인트
+
+
+def find_final_point(history: Dict, end_ts: float) -> Optional[Dict]:
+    """이벤트 종료 시각 이전의 마지막 포인트 (예측값과 비교할 실제 값)"""
+    final = None
+    for point in iter_points(history, end=end_ts):
+        final = point
+    return final
+
+
+class _ErrorBucket:
+    """남은 일수 구간별 예측 오차 누적"""
+
+    def __init__(self):
+        self.count = 0
+        self.compare_general = 0.0
+        self.compare_fgp = 0.0
+        self.calc_general = 0.0
+        self.calc_fgp = 0.0
+        self.verdicts = 0
+        self.verdicts_correct = 0
+
+    def as_dict(self) -> Dict:
+        n = self.count or 1
+        return {
+            "samples": self.count,
+            "compare_general_mape": self.compare_general / n * 100,
+            "compare_fgp_mape": self.compare_fgp / n * 100,
+            "calc_general_mape": self.calc_general / n * 100,
+            "calc_fgp_mape": self.calc_fgp / n * 100,
+            "verdict_accuracy": (self.verdicts_correct / self.verdicts * 100) if self.verdicts else None
+        }
+
+
+def replay(open_history: Callable[[], Dict],
+           reference_rate: float = DEFAULT_REFERENCE_RATE) -> Dict:
+    """
+    저장된 히스토리를 시뮬레이션 시계로 재생하며 /compare, /calc 예측을 실제 결과와 비교
+
+    각 포인트 시점에 수집기와 같은 방식으로 그날의 통계를 갱신하고, get_remaining_time에
+    해당 시각을 넘겨 compare_pools와 calculate_reward를 실행한다. 예측 대상은 이벤트 종료
+    (또는 히스토리의 마지막 포인트) 시점의 실제 풀 포인트와 보상이다.
+
+    Args:
+        open_history: 히스토리를 새로 여는 함수 (실제 값을 찾기 위해 두 번 순회함)
+        reference_rate: calculate_reward 예측 검증에 쓰는 가상 사용자의 시간당 포인트
+
+    Returns:
+        처리한 포인트 수, 소요 시간, 전체/남은 일수별 오차 요약
+    """
+    started = time.perf_counter()
+    end_time = get_event_end_time()
+    final = find_final_point(open_history(), end_time.timestamp())
+    if final is None:
+        raise ValueError("History is empty")
+
+    final_ts = final['updatedAt']
+    actual_general = final['generalPoint']
+    actual_fgp = final['fgpPoint']
+    # 실제 결과 기준 효율 판정 (compare_command의 total_ratio > 1과 같은 의미)
+    actual_general_better = (15_000_000 / actual_general) / (22_500_000 / actual_fgp) > 1
+
+    overall = _ErrorBucket()
+    buckets: Dict[int, _ErrorBucket] = {}
+    processed = 0
+    day = None
+    day_first = None
+    day_count = 0
+
+    for point in iter_points(open_history(), end=final_ts):
+        processed += 1
+        ts = point['updatedAt']
+
+        # 수집기와 같은 방식의 당일 통계 (시뮬레이션 시각까지의 데이터만 사용)
+        date = datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+        if date != day:
+            day, day_first, day_count = date, point, 0
+        day_count += 1
+        stat = calculate_daily_stat(day_first, point, day_count)
+
+        remaining_hours, _ = get_remaining_time(datetime.fromtimestamp(ts, end_time.tzinfo))
+        horizon = min(remaining_hours, (final_ts - ts) / 3600)
+        if horizon <= 0:
+            continue
+
+        bucket = buckets.setdefault(int(horizon // 24), _ErrorBucket())
+        targets = (overall, bucket)
+
+        # calculate_reward 예측 (/calc와 같이 현재 시간당 포인트 사용)
+        general_reward, _ = calculate_reward(0, reference_rate, "general", point['generalPoint'],
+                                             point['generalPointPerHour'], horizon)
+        fgp_reward, _ = calculate_reward(0, reference_rate, "fgp", point['fgpPoint'],
+                                         point['fgpPointPerHour'], horizon)
+        actual_general_reward = reference_rate * horizon / actual_general * 15_000_000
+        actual_fgp_reward = reference_rate * horizon / actual_fgp * 22_500_000
+        calc_general_error = abs(general_reward - actual_general_reward) / actual_general_reward
+        calc_fgp_error = abs(fgp_reward - actual_fgp_reward) / actual_fgp_reward
+
+        # compare_pools 예측 (/compare와 같이 당일 평균 시간당 포인트 사용)
+        comparison = None
+        if stat and stat['general_hourly_average'] > 0 and stat['fgp_hourly_average'] > 0:
+            comparison = compare_pools(point, stat['general_hourly_average'],
+                                       stat['fgp_hourly_average'], horizon)
+
+        for target in targets:
+            target.count += 1
+            target.calc_general += calc_general_error
+            target.calc_fgp += calc_fgp_error
+            if comparison:
+                target.compare_general += abs(comparison['general_total'] - actual_general) / actual_general
+                target.compare_fgp += abs(comparison['fgp_total'] - actual_fgp) / actual_fgp
+                target.verdicts += 1
+                if (comparison['total_ratio'] > 1) == actual_general_better:
+                    target.verdicts_correct += 1
+
+    return {
+        "points": processed,
+        "elapsed_seconds": time.perf_counter() - started,
+        "final_update": datetime.fromtimestamp(final_ts).isoformat(),
+        "overall": overall.as_dict(),
+        "by_days_left": {days: buckets[days].as_dict() for days in sorted(buckets)}
+    }
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"Replayed {report['points']} points in {report['elapsed_seconds']:.2f}s "
+        f"(actual values from {report['final_update']})",
+        "",
+        f"{'days left':>9} {'samples':>8} {'cmp gen%':>9} {'cmp fgp%':>9} "
+        f"{'calc gen%':>10} {'calc fgp%':>10} {'verdict%':>9}"
+    ]
+    rows = list(report['by_days_left'].items()) + [("all", report['overall'])]
+    for days, summary in rows:
+        verdict = summary['verdict_accuracy']
+        lines.append(
+            f"{days:>9} {summary['samples']:>8} "
+            f"{summary['compare_general_mape']:>9.2f} {summary['compare_fgp_mape']:>9.2f} "
+            f"{summary['calc_general_mape']:>10.2f} {summary['calc_fgp_mape']:>10.2f} "
+            f"{'-' if verdict is None else f'{verdict:.1f}':>9}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay collected history and report projection error")
+    parser.add_argument('--data-file', default='kaia_pool_data.json')
+    parser.add_argument('--reference-rate', default=str(DEFAULT_REFERENCE_RATE),
+                        help="points/hour of the simulated user (e.g. 2M)")
+    args = parser.parse_args()
+
+    report = replay(lambda: open_history_file(args.data_file),
+                    reference_rate=parse_number(args.reference_rate))
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# retention.py
+from datetime import datetime
+from typing import Dict, List, Optional, Iterable, Iterator, Set, Tuple
+
+HOUR_SECONDS = 3600
+DAY_SECONDS = 86400
+
+# 롤업에 보관하는 포인트 필드
+POINT_FIELDS = ('updatedAt', 'totalPoint', 'generalPoint', 'fgpPoint',
+                'generalPointPerHour', 'fgpPointPerHour', 'defiTvl',
+                'fetchedAt', 'kaiaPrice', 'cmethPrice', 'fbtcPrice')
+
+
+class RetentionPolicy:
+    """보관 정책: 최근 raw_days 일은 원본, hourly_days 일까지는 시간별, 그 이후는 일별 롤업"""
+
+    def __init__(self, raw_days: int = 7, hourly_days: int = 90):
+        if raw_days < 0 or hourly_days < raw_days:
+            raise ValueError("hourly_days must be >= raw_days >= 0")
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+
+    def raw_cutoff(self, now: float) -> float:
+        return now - self.raw_days * DAY_SECONDS
+
+    def hourly_cutoff(self, now: float) -> float:
+        return now - self.hourly_days * DAY_SECONDS
+
+
+def _snapshot_point(point: Dict) -> Dict:
+    return {k: point[k] for k in POINT_FIELDS if k in point}
+
+
+def _local_day_start(ts: float) -> float:
+    """로컬 타임존 기준 해당 날짜 00:00의 타임스탬프"""
+    return datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def _rate(open_point: Dict, close_point: Dict, key: str) -> float:
+    hours = (close_point['updatedAt'] - open_point['updatedAt']) / 3600
+    if hours <= 0:
+        return 0.0
+    return (close_point[key] - open_point[key]) / hours
+
+
+def build_rollup(points: List[Dict], bucket_start: float, bucket_seconds: int) -> Dict:
+    """정렬된 원본 포인트 목록을 하나의 롤업으로 요약"""
+    open_point = points[0]
+    close_point = points[-1]
+    tvls = [p['defiTvl'] for p in points if 'defiTvl' in p]
+    return {
+        "bucket_start": bucket_start,
+        "bucket_seconds": bucket_seconds,
+        "count": len(points),
+        "open": _snapshot_point(open_point),
+        "close": _snapshot_point(close_point),
+        "general_rate": round(_rate(open_point, close_point, 'generalPoint'), 2),
+        "fgp_rate": round(_rate(open_point, close_point, 'fgpPoint'), 2),
+        "tvl_min": min(tvls) if tvls else None,
+        "tvl_max": max(tvls) if tvls else None,
+    }
+
+
+def merge_rollups(rollups: List[Dict], bucket_start: float, bucket_seconds: int) -> Dict:
+    """정렬된 롤업 목록을 더 큰 버킷의 롤업 하나로 병합"""
+    open_point = rollups[0]['open']
+    close_point = rollups[-1]['close']
+    tvl_mins = [r['tvl_min'] for r in rollups if r.get('tvl_min') is not None]
+    tvl_maxs = [r['tvl_max'] for r in rollups if r.get('tvl_max') is not None]
+    return {
+        "bucket_start": bucket_start,
+        "bucket_seconds": bucket_seconds,
+        "count": sum(r['count'] for r in rollups),
+        "open": open_point,
+        "close": close_point,
+        "general_rate": round(_rate(open_point, close_point, 'generalPoint'), 2),
+        "fgp_rate": round(_rate(open_point, close_point, 'fgpPoint'), 2),
+        "tvl_min": min(tvl_mins) if tvl_mins else None,
+        "tvl_max": max(tvl_maxs) if tvl_maxs else None,
+    }
+
+
+def _group_by(items: Iterable[Dict], key_func) -> List[Tuple[float, List[Dict]]]:
+    """시간순으로 정렬된 항목을 연속 버킷 단위로 묶음"""
+    groups: List[Tuple[float, List[Dict]]] = []
+    for item in items:
+        key = key_func(item)
+        if groups and groups[-1][0] == key:
+            groups[-1][1].append(item)
+        else:
+            groups.append((key, [item]))
+    return groups
+
+
+def _merge_tier(existing: List[Dict], new: List[Dict], bucket_seconds: Optional[int]) -> List[Dict]:
+    """기존 티어의 마지막 버킷과 새 롤업이 겹치면 하나로 합침"""
+    merged = list(existing)
+    for rollup in new:
+        if merged and merged[-1]['bucket_start'] == rollup['bucket_start']:
+            merged[-1] = merge_rollups([merged[-1], rollup], rollup['bucket_start'],
+                                       bucket_seconds or rollup['bucket_seconds'])
+        else:
+            merged.append(rollup)
+    return merged
+
+
+def compact(history: Dict, policy: RetentionPolicy, now: float) -> Optional[Dict]:
+    """
+    오래된 원본 포인트를 시간별 롤업으로, 오래된 시간별 롤업을 일별 롤업으로 압축
+
+    이벤트 루프 밖(스레드)에서 실행할 수 있도록 입력을 수정하지 않고 결과만 반환한다.
+
+    Returns:
+        압축할 것이 없으면 None, 아니면 raw_consumed(앞에서부터 제거할 원본 포인트 수),
+        hourly_rollups, daily_rollups를 담은 딕셔너리
+    """
+    raw_points = history.get('data_points', [])
+    hourly = history.get('hourly_rollups', [])
+    daily = history.get('daily_rollups', [])
+
+    # 완결된 시간 버킷만 압축하고, 변경 감지를 위해 마지막 원본 포인트는 항상 남겨둠
+    raw_cutoff = policy.raw_cutoff(now)
+    raw_cutoff -= raw_cutoff % HOUR_SECONDS
+    raw_consumed = 0
+    while (raw_consumed < len(raw_points) - 1 and
+           raw_points[raw_consumed]['updatedAt'] < raw_cutoff):
+        raw_consumed += 1
+
+    new_hourly = []
+    for bucket_start, points in _group_by(raw_points[:raw_consumed],
+                                          lambda p: p['updatedAt'] - p['updatedAt'] % HOUR_SECONDS):
+        new_hourly.append(build_rollup(points, bucket_start, HOUR_SECONDS))
+    hourly = _merge_tier(hourly, new_hourly, HOUR_SECONDS)
+
+    # 완결된 날짜의 시간별 롤업만 일별로 압축
+    hourly_cutoff = _local_day_start(policy.hourly_cutoff(now))
+    hourly_consumed = 0
+    while (hourly_consumed < len(hourly) and
+           hourly[hourly_consumed]['bucket_start'] + HOUR_SECONDS <= hourly_cutoff):
+        hourly_consumed += 1
+
+    new_daily = []
+    for day_start, rollups in _group_by(hourly[:hourly_consumed],
+                                        lambda r: _local_day_start(r['bucket_start'])):
+        new_daily.append(merge_rollups(rollups, day_start, DAY_SECONDS))
+    daily = _merge_tier(daily, new_daily, DAY_SECONDS)
+
+    if raw_consumed == 0 and hourly_consumed == 0:
+        return None
+
+    return {
+        "raw_consumed": raw_consumed,
+        "hourly_rollups": hourly[hourly_consumed:],
+        "daily_rollups": daily,
+    }
+
+
+def iter_points(history: Dict, start: Optional[float] = None,
+                end: Optional[float] = None) -> Iterator[Dict]:
+    """
+    티어를 오래된 순(일별 → 시간별 → 원본)으로 이어 붙여 포인트를 시간순으로 반환
+
+    롤업 구간은 시작/종료 포인트로 표현되며, 각 포인트에 'tier' 키가 붙는다.
+    """
+    def in_range(ts: float) -> bool:
+        return (start is None or ts >= start) and (end is None or ts <= end)
+
+    for tier in ('daily_rollups', 'hourly_rollups'):
+        for rollup in history.get(tier, []):
+            bucket_end = rollup['bucket_start'] + rollup['bucket_seconds']
+            if (end is not None and rollup['bucket_start'] > end) or \
+               (start is not None and bucket_end < start):
+                continue
+            name = tier.split('_')[0]
+            for point in (rollup['open'], rollup['close']):
+                if in_range(point['updatedAt']):
+                    yield dict(point, tier=name)
+                if rollup['count'] == 1:
+                    break
+
+    for point in history.get('data_points', []):
+        if in_range(point['updatedAt']):
+            yield dict(point, tier='raw')
+
+
+def summarize_days(history: Dict, dates: Optional[Set[str]] = None) -> Dict[str, Tuple[Dict, Dict, int]]:
+    """
+    모든 티어에 걸쳐 날짜별 (첫 포인트, 마지막 포인트, 원본 포인트 수)를 계산
+
+    Args:
+        dates: 지정하면 해당 날짜만 계산
+    """
+    summary: Dict[str, List] = {}
+
+    def add(first: Dict, last: Dict, count: int) -> None:
+        date = datetime.fromtimestamp(first['updatedAt']).strftime('%Y-%m-%d')
+        if dates is not None and date not in dates:
+            return
+        entry = summary.get(date)
+        if entry is None:
+            summary[date] = [first, last, count]
+            return
+        if first['updatedAt'] < entry[0]['updatedAt']:
+            entry[0] = first
+        if last['updatedAt'] > entry[1]['updatedAt']:
+            entry[1] = last
+        entry[2] += count
+
+    for tier in ('daily_rollups', 'hourly_rollups'):
+        for rollup in history.get(tier, []):
+            add(rollup['open'], rollup['close'], rollup['count'])
+
+    for point in history.get('data_points', []):
+        add(point, point, 1)
+
+    return {date: tuple(entry) for date, entry in summary.items()}
+
+
+def calculate_daily_stat(first_point: Dict, last_point: Dict, count: int) -> Optional[Dict]:
+    """하루의 첫/마지막 포인트로 시간당 평균 증가량 계산 (계산할 수 없으면 None)"""
+    if count < 2:  # 최소 2개 이상의 데이터 포인트가 있어야 변화율 계산 가능
+        return None
+
+    # 시간 차이 계산 (시간 단위)
+    time_diff = (last_point['updatedAt'] - first_point['updatedAt']) / 3600
+    if time_diff <= 0:
+        return None
+
+    # FGP 풀 변화율 계산
+    fgp_rate = (last_point['fgpPoint'] - first_point['fgpPoint']) / time_diff
+    # General 풀 변화율 계산
+    general_rate = (last_point['generalPoint'] - first_point['generalPoint']) / time_diff
+
+    return {
+        "fgp_hourly_average": round(fgp_rate, 2),
+        "general_hourly_average": round(general_rate, 2),
+        "time_span_hours": round(time_diff, 2),
+        "data_points": count,
+        "first_update": datetime.fromtimestamp(first_point['updatedAt']).isoformat(),
+        "last_update": datetime.fromtimestamp(last_point['updatedAt']).isoformat()
+    }
@@ -0,0 +1,45 @@
+# scenario.py
+from typing import List, Sequence, Tuple
+
+# 축별 값 개수 제한 (표 하나가 메시지 하나에 들어가는 크기)
+MAX_GRID_AXIS = 12
+# 전체 칸 수 제한 (풀별 성장률 표 3개, 메시지 3개 이내)
+MAX_GRID_CELLS = MAX_GRID_AXIS * MAX_GRID_AXIS * 3
+
+
+def compute_reward_grid(my_points: float,
+                        rates: Sequence[float],
+                        horizons: Sequence[float],
+                        growths: Sequence[float],
+                        total_points: float,
+                        points_per_hour: float,
+                        total_reward: float) -> List[List[List[float]]]:
+    """
+    calculate_reward와 같은 식으로 (성장률, 예치 속도, 남은 시간) 그리드의 예상 보상을 한 번에 계산
+
+    reward = (my_points + rate * h) / (total_points + points_per_hour * growth * h) * total_reward
+    에서 (growth, h)마다 분모를 한 번만 계산하고, 각 칸은 곱셈/덧셈 한 번으로 구한다.
+
+    Returns:
+        grid[growth_index][rate_index][horizon_index] = 예상 KAIA 보상
+    """
+    grid = []
+    for growth in growths:
+        # 남은 시간별 계수: base = my_points * inv, step = h * inv
+        coefficients: List[Tuple[float, float]] = []
+        for hours in horizons:
+            pool_final_points = total_points + points_per_hour * growth * hours
+            inv = total_reward / pool_final_points
+            coefficients.append((my_points * inv, hours * inv))
+        grid.append([[base + rate * step for base, step in coefficients] for rate in rates])
+    return grid
+
+
+def parse_list(value: str, parse_item) -> List[float]:
+    """'1M,2M,4M' 형식의 쉼표 구분 목록을 변환"""
+    items = [parse_item(v) for v in value.split(',') if v]
+    if not items:
+        raise ValueError(f"Empty list: {value}")
+    if len(items) > MAX_GRID_AXIS:
+        raise ValueError(f"Too many values (max {MAX_GRID_AXIS}): {value}")
+    return items